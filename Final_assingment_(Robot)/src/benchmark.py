@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""
+Module used to measure the throughput of the decoding code off the robot,
+and of the whole robot on the simulated devices.
+Run it with "python3 benchmark.py" from the src/ folder. Every result is a rate,
+higher is better. Results can be saved as JSON with --save and compared against
+a saved baseline with --compare, which fails if a rate drops more than the threshold.
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from timeit import repeat
+import main
+import simulator
+from buttons import ButtonEvents
+from hamming_code import HammingCode, numpy, unpack
+from pipeline import Pipeline
+from robot import Robot
+from speech import Announcer, Verbosity
+from stack_machine import Character, Instruction, Program, StackMachine
+
+# Decoded words of the example card of the simulator
+EXAMPLE_PROGRAM = [HammingCode().decode(code)[0] for code in simulator.EXAMPLE_CARD]
+
+
+# Program made mostly of instructions: doubles a number and adds 2 to it, 50 times over
+ARITHMETIC_PROGRAM = ([0b000011] + [Instruction.DUP.value, 0b000010, Instruction.ADD.value, Instruction.DEL.value] * 50
+                      + [Instruction.STP.value])
+
+# Seed of the random words, so every run and a saved baseline measure the same corpus
+SEED = 23
+
+# Words pushed before every instruction in bench_opcodes, SPEAK says "AB"
+OPERANDS = [0b000110, 0b000011]
+SPEAK_OPERANDS = [Character.B.value, Character.A.value, 0b000010]
+
+
+def timeit(func, number: int = 1, runs: int = 3) -> float:
+    """
+    Returns the seconds taken by the fastest of some runs of number calls, the slower
+    runs are the ones disturbed by the rest of the system
+    """
+    return min(repeat(func, number=number, repeat=runs))
+
+
+def report(results: dict, name: str, rate: float, unit: str):
+    """
+    Prints a result and stores it under its name
+    """
+    results[name] = rate
+    print("{:<40}{:>14.0f} {}".format(name, rate, unit))
+
+
+def random_codes(decoder: HammingCode, rows: int, errors: int = 0, seed: int = SEED) -> list:
+    """
+    Generates valid codewords with the given number of bit errors in every word, the same for the same seed
+    """
+    generator = random.Random(seed)
+    codes = []
+    for _ in range(rows):
+        code = decoder.encode_word(generator.randrange(64))
+        for bit in generator.sample(range(11), errors):
+            code ^= 1 << bit
+        codes.append(code)
+    return codes
+
+
+def bench_decode(rows: int = 100000) -> dict:
+    """
+    Compares the scalar decoder against the batch decoder on clean words and words with one or two errors
+    """
+    results = OrderedDict()
+    decoder = HammingCode()
+    for errors, label in ((0, "clean"), (1, "1 error"), (2, "2 errors")):
+        codes = random_codes(decoder, rows, errors)
+        tuples = [unpack(code, 11) for code in codes]
+        buffer = b"".join(code.to_bytes(2, "big") for code in codes)
+
+        cases = [
+            ("decode (tuple)", lambda: [decoder.decode(code) for code in tuples]),
+            ("decode (int)", lambda: [decoder.decode(code) for code in codes]),
+            ("decode_soft (tuple)", lambda: [decoder.decode_soft(code) for code in tuples]),
+            ("decode_batch (bytes)", lambda: decoder.decode_batch(buffer)),
+        ]
+        if numpy is not None:
+            matrix = numpy.array(tuples, dtype=numpy.uint8)
+            cases.append(("decode_batch (matrix)", lambda: decoder.decode_batch(matrix)))
+
+        for name, func in cases:
+            seconds = timeit(func, number=1)
+            report(results, name[:-1] + ", " + label + ")", rows / seconds, "words/s")
+    return results
+
+
+def bench_encode(rows: int = 100000) -> dict:
+    """
+    Compares the scalar encoder against the batch encoder
+    """
+    results = OrderedDict()
+    encoder = HammingCode()
+    generator = random.Random(SEED)
+    words = [generator.randrange(64) for _ in range(rows)]
+    tuples = [unpack(word, 6) for word in words]
+
+    cases = [
+        ("encode (tuple)", lambda: [encoder.encode(word) for word in tuples]),
+        ("encode (int)", lambda: [encoder.encode(word) for word in words]),
+        ("encode_batch (int)", lambda: encoder.encode_batch(words)),
+    ]
+    if numpy is not None:
+        array = numpy.array(words, dtype=numpy.uint8)
+        matrix = numpy.array(tuples, dtype=numpy.uint8)
+        cases.append(("encode_batch (array)", lambda: encoder.encode_batch(array)))
+        cases.append(("encode_batch (matrix)", lambda: encoder.encode_batch(matrix)))
+
+    for name, func in cases:
+        seconds = timeit(func, number=1)
+        report(results, name, rows / seconds, "words/s")
+    return results
+
+
+def bench_program(runs: int = 20000) -> dict:
+    """
+    Compares executing a program word by word against run_program(), on the example program
+    and on one made mostly of instructions
+    """
+    results = OrderedDict()
+    for label, words in (("example", EXAMPLE_PROGRAM), ("arithmetic", ARITHMETIC_PROGRAM)):
+        program = Program(words)
+        number = runs * len(EXAMPLE_PROGRAM) // len(words)
+
+        def word_by_word():
+            sm = StackMachine()
+            for word in words:
+                sm.do(word)
+
+        cases = [
+            ("do", word_by_word),
+            ("run_program", lambda: StackMachine().run_program(words)),
+            ("run_program (compiled)", lambda: StackMachine().run_program(program)),
+        ]
+        for name, func in cases:
+            # SPEAK prints its output, which is not part of the measurement
+            with redirect_stdout(io.StringIO()):
+                seconds = timeit(func, number=number, runs=5)
+            report(results, name + " (" + label + ")", number * len(words) / seconds, "words/s")
+    return results
+
+
+def bench_opcodes(runs: int = 100000) -> dict:
+    """
+    Measures StackMachine.do for every instruction, on a machine whose stack is restored
+    to the operands before every call, minus the time of restoring the stack alone
+    """
+    results = OrderedDict()
+    restore = lambda stack: setattr(sm, "stack", stack.copy())
+
+    with redirect_stdout(io.StringIO()):
+        for opcode in list(Instruction) + [Character.SPEAK]:
+            sm = StackMachine()
+            for word in SPEAK_OPERANDS if opcode == Character.SPEAK else OPERANDS:
+                sm.do(word)
+            stack = sm.stack.copy()
+            setup = timeit(lambda: restore(stack), number=runs, runs=5)
+            seconds = timeit(lambda: (restore(stack), sm.do(opcode.value)), number=runs, runs=5) - setup
+            # Guards against noise larger than the cost of the instruction
+            results["do (" + opcode.name + ")"] = runs / max(seconds, 1e-9)
+    for name, rate in results.items():
+        print("{:<32}{:>14.0f} ops/s".format(name, rate))
+    return results
+
+
+def bench_pipeline(runs: int = 2000) -> dict:
+    """
+    Measures decoding and executing whole programs from raw scans, with a single-bit
+    error in a quarter of the lines, as scans (tuples) and as packed words
+    """
+    results = OrderedDict()
+    decoder = HammingCode()
+    generator = random.Random(SEED)
+    codes = []
+    for word in EXAMPLE_PROGRAM:
+        code = decoder.encode_word(word)
+        if generator.random() < 0.25:
+            code ^= 1 << generator.randrange(11)
+        codes.append(code)
+    scans = [unpack(code, 11) for code in codes]
+
+    def execute(words):
+        pipeline = Pipeline(decoder)
+        for word in words:
+            pipeline.feed(word)
+
+    for name, words in (("pipeline (scan)", scans), ("pipeline (int)", codes)):
+        with redirect_stdout(io.StringIO()):
+            seconds = timeit(lambda: execute(words), number=runs)
+        report(results, name, runs * len(words) / seconds, "lines/s")
+    return results
+
+
+def bench_cards(cards: int = 5) -> dict:
+    """
+    Runs main.read_card on the simulated robot, reading the example program, with the
+    line scans stopping at every cell and sweeping. Simulated time is independent
+    of the computer, so cards per hour only change when the robot code does.
+    """
+    results = OrderedDict()
+    # Cards of 10 lines that never reach the STP instruction
+    card = (simulator.EXAMPLE_CARD[:-1] * cards)[:10 * cards]
+
+    for name, sweep in (("read_card (step)", False), ("read_card (sweep)", True)):
+        world = simulator.reset(card=card, speedup=float("inf"), noise=20, seed=1)
+        robot = Robot(devices=simulator)
+        spk = Announcer(simulator.Sound(), verbosity=Verbosity.SILENT)
+        btn = ButtonEvents(simulator.Button())
+        pipeline = Pipeline()
+        try:
+            with redirect_stdout(io.StringIO()):
+                for _ in range(cards):
+                    main.read_card(robot, pipeline, spk, btn, sweep)
+        finally:
+            # Their threads would outlive the benchmark otherwise
+            spk.close()
+            btn.close()
+        report(results, name, cards * 3600 / world.now(), "cards/h")
+    return results
+
+
+BENCHMARKS = OrderedDict([
+    ("decode", bench_decode),
+    ("encode", bench_encode),
+    ("program", bench_program),
+    ("opcodes", bench_opcodes),
+    ("pipeline", bench_pipeline),
+    ("cards", bench_cards),
+])
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compares results against a baseline
+
+    Args:
+        results: Rates measured, by name
+        baseline: Rates of the baseline, by name, results missing from it are not compared
+        threshold: Largest accepted drop, as a fraction of the baseline rate
+    Returns:
+        list: Names of the results that dropped more than the threshold
+    """
+    regressions = []
+    for name, rate in results.items():
+        if name not in baseline:
+            continue
+        change = rate / baseline[name] - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(name)
+        print("{:<32}{:>+13.1%}{}".format(name, change, "  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def run(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the throughput of the robot code")
+    parser.add_argument("benchmarks", nargs="*",
+                        help="benchmarks to run, of " + ", ".join(BENCHMARKS) + " (default: all)")
+    parser.add_argument("--save", help="JSON file to save the results to")
+    parser.add_argument("--compare", help="JSON file of a baseline saved with --save")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="largest accepted drop of a rate against the baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: " + name)
+
+    results = OrderedDict()
+    for name in args.benchmarks or BENCHMARKS:
+        results.update(BENCHMARKS[name]())
+
+    if args.save is not None:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("{} results dropped more than {:.0%} against {}".format(len(regressions), args.threshold, args.compare))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
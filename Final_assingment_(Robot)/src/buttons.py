@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""
+Event-driven access to the brick buttons: a background thread sleeps on the
+input device and queues every button press, instead of callers polling the
+button state in a loop.
+"""
+
+import os
+import queue
+import select
+import threading
+from time import sleep, time
+
+
+# Bytes read at once from an event file, room for many input events
+EVENT_BUFFER = 1024
+
+
+def event_files(button) -> list:
+    """
+    Finds the input event files a button reads its state from, to wait on them
+
+    Args:
+        button: ev3dev2 Button with an evdev_device, or python-ev3dev 1.x Button keeping
+                its event files open by the paths in Button._buttons
+    Returns:
+        list: File descriptors of the event files, empty if they cannot be found
+    """
+    # ev3dev2, the property raises if the input device is missing
+    try:
+        return [button.evdev_device.fd]
+    except Exception:
+        pass
+    # python-ev3dev 1.x, e.g. /dev/input/by-path/platform-gpio_keys-event for every button
+    try:
+        paths = sorted({spec["name"] for spec in button._buttons.values()})
+        return [button._button_file(path).fileno() for path in paths]
+    except Exception:
+        return []
+
+
+class ButtonEvents:
+    """
+    Queues the names of the buttons pressed ("up", "enter", ...) as they are pressed
+    """
+
+    def __init__(self, button, size: int = 16, interval: float = 0.05) -> None:
+        """
+        Args:
+            button: Object with the ev3.Button process()/on_change interface, e.g. ev3.Button()
+            size: Maximum number of pending presses, further presses are dropped
+            interval: Polling period, in seconds, only used if the event files of the button are not found.
+                      The button is then only polled while get() or wait_for() are waiting.
+        """
+        self.button = button
+        self.interval = interval
+        self.files = event_files(button)
+        self.presses = queue.Queue(size)
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__waiters = 0
+        self.__waiting = threading.Event()
+        # Written to by close() to wake the reader up from select
+        self.__wake = os.pipe()
+        button.on_change = self.__changed
+        self.__reader = threading.Thread(target=self.__read, daemon=True)
+        self.__reader.start()
+
+    def get(self, timeout: float = None):
+        """
+        Returns the next button pressed
+
+        Args:
+            timeout: Maximum time to wait, in seconds, forever if not given
+        Returns:
+            str: Name of the button, None if the timeout expired first
+        """
+        with self.__lock:
+            self.__waiters += 1
+            self.__waiting.set()
+        try:
+            return self.presses.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            with self.__lock:
+                self.__waiters -= 1
+                if not self.__waiters:
+                    self.__waiting.clear()
+
+    def wait_for(self, *names: str, timeout: float = None):
+        """
+        Waits for one of the given buttons to be pressed, other presses are discarded
+
+        Args:
+            names: Names of the buttons to wait for
+            timeout: Maximum time to wait, in seconds, forever if not given
+        Returns:
+            str: Name of the button, None if the timeout expired first
+        """
+        deadline = None if timeout is None else time() + timeout
+        while True:
+            name = self.get(None if deadline is None else max(0, deadline - time()))
+            if name is None or name in names:
+                return name
+
+    def clear(self) -> None:
+        """
+        Discards the presses not handled yet, so only new presses are seen
+        """
+        try:
+            while True:
+                self.presses.get_nowait()
+        except queue.Empty:
+            pass
+
+    def close(self) -> None:
+        """
+        Stops the reader thread
+        """
+        self.__closed = True
+        self.__waiting.set()
+        os.write(self.__wake[1], b"\0")
+        self.__reader.join()
+        for fd in self.__wake:
+            os.close(fd)
+
+    def __changed(self, changes: list) -> None:
+        """
+        on_change handler of the button, receives (name, pressed) pairs
+        """
+        for name, pressed in changes:
+            if pressed:
+                try:
+                    self.presses.put_nowait(name)
+                except queue.Full:
+                    pass
+
+    def __read(self) -> None:
+        """
+        Body of the reader thread. Blocks on the event files until there is input,
+        drains the raw events and lets the button report the state changes.
+        """
+        while not self.__closed:
+            if self.files:
+                try:
+                    ready = select.select(self.files + [self.__wake[0]], [], [])[0]
+                    if self.__wake[0] in ready:
+                        return
+                    for fd in ready:
+                        os.read(fd, EVENT_BUFFER)
+                except BlockingIOError:
+                    pass
+                except OSError as error:
+                    print("Button events failed, polling instead: " + str(error))
+                    self.files = []
+                    continue
+            else:
+                # Nobody sees the presses while nobody waits, so the button is left alone meanwhile
+                self.__waiting.wait()
+                if self.__closed:
+                    return
+                sleep(self.interval)
+                # The waiter may have left meanwhile, the next press is kept for the next one
+                if not self.__waiting.is_set():
+                    continue
+            try:
+                self.button.process()
+            except Exception as error:
+                print("Button failed: " + str(error))
+                sleep(self.interval)
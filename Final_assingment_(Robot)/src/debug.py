@@ -18,48 +18,44 @@ mapping of robot keys to functions:
 ** -> Enter (Saves current binary value read to list)
 """
 
-from enum import IntEnum
 from hamming_code import HammingCode, HCResult
 from stack_machine import StackMachine, SMState
 from robot import *
-
-
-class Color(IntEnum):
-    """
-    Enum used to interact with values read from the sensor
-    """
-    RED = 0
-    GREEN = 1
-    BLUE = 2
+from buttons import ButtonEvents
+from scan import color
 
 
 def run():
     robot = Robot()
     decoder = HammingCode()
     sm = StackMachine()
-    cs = ev3.ColorSensor("in4")
-    cs.mode = 'RGB-RAW'
-    btn = ev3.Button()
+    cs = robot.sensor
+    btn = ButtonEvents(robot.devices.Button())
     word = []
-    spk = ev3.Sound()
+    spk = robot.devices.Sound()
     spk.speak("Running on debug mode")
     while True:
         value = cs.bin_data("hhhh")
         print("value: " + str(value) + " / interpreted as: " + translate_raw(value))
-        if btn.up:
-            robot.scroll_step()
-        if btn.right:
-            robot.sensor_step()
-        if btn.left:
-            robot.sensor_reset()
-        if btn.enter:
+        # Reacts to a press as soon as it happens, the sensor value is printed at least every 250 ms
+        pressed = btn.get(0.25)
+        try:
+            if pressed == "up":
+                robot.scroll_step()
+            if pressed == "right":
+                robot.sensor_step()
+            if pressed == "left":
+                robot.sensor_reset()
+            if pressed == "down":
+                robot.readjust_barcode()
+        except MotorError as error:
+            # The motors are moved by hand here, a failed move is only reported
+            print(error)
+        if pressed == "enter":
             word.append(bin_value(translate_raw(value)))
-        if btn.backspace:
+        if pressed == "backspace":
             print(str(word))
             word.append("-")
-        if btn.down:
-            robot.readjust_barcode()
-        sleep(0.25)
 
 
 def translate(value):
@@ -86,16 +82,10 @@ def translate(value):
 
 def translate_raw(value):
     """
-    Translates value of color sensor to the color detected when in "RAW-RGB" mode
+    Translates value of color sensor to the color detected when in "RAW-RGB" mode,
+    with the same classifier as the rest of the robot
     """
-    if value[Color.RED] < 200 and value[Color.GREEN] < 250 and value[Color.BLUE] < 200:
-        return "black"
-    elif value[Color.RED] > value[Color.GREEN] and value[Color.RED] > value[Color.BLUE]:
-        return "red"
-    elif value[Color.RED] < value[Color.GREEN] and value[Color.BLUE] < value[Color.GREEN]:
-        return "white"
-    else:
-        return "Error"
+    return color(value) or "Error"
 
 
 def bin_value(color):
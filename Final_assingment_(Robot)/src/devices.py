@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""
+Selection of the device backend used by the robot: the ev3dev devices of the
+brick or the simulated ones of the simulator module. Both provide the same
+MediumMotor, LargeMotor, ColorSensor, Button and Sound classes.
+"""
+
+import os
+
+
+# Environment variable selecting the backend when none is given
+BACKEND_VARIABLE = "ROBOT_BACKEND"
+
+BACKENDS = ("ev3", "sim")
+
+
+def load(name: str = None):
+    """
+    Imports a device backend. The ev3dev module is only imported when it is asked for,
+    so everything else runs off the brick with the simulator.
+
+    Args:
+        name: "ev3" or "sim", $ROBOT_BACKEND or "ev3" if not given
+    Returns:
+        module: Backend providing the device classes
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if name is None:
+        name = os.environ.get(BACKEND_VARIABLE, "ev3")
+    if name == "ev3":
+        import ev3dev.ev3 as backend
+    elif name == "sim":
+        import simulator as backend
+    else:
+        raise ValueError("Unknown device backend: " + str(name))
+    return backend
@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
 
+import sys
+from array import array
 from enum import Enum
 from typing import List, Tuple, Union
-from functools import reduce
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is optional, batch operations fall back to plain Python without it
+    numpy = None
 
 
 # IMPORTANT NOTE: DO NOT IMPORT THE ev3dev.ev3 MODULE IN THIS FILE
@@ -16,170 +23,506 @@ class HCResult(Enum):
     UNCORRECTABLE = 'ERROR'
 
 
+# Codes used for the results of batch operations, RESULT_CODES[code] gives the HCResult
+RESULT_CODES = (HCResult.VALID, HCResult.CORRECTED, HCResult.UNCORRECTABLE)
+
+# Words of up to this many bits get complete lookup tables for encoding and decoding
+TABLE_BITS = 12
+
+# Erased bits the extended code can fill in soft decoding, its minimum distance is 4
+MAX_ERASURES = 3
+
+# Predefined non-systematic generator matrix G' of the (10, 6) code used on the bar code cards
+GENERATOR = [[1, 1, 1, 0, 0, 0, 0, 1, 0, 0],
+             [0, 1, 0, 0, 1, 0, 0, 1, 0, 0],
+             [1, 0, 0, 1, 0, 1, 0, 0, 0, 0],
+             [0, 0, 0, 1, 0, 0, 1, 1, 0, 0],
+             [1, 1, 0, 1, 0, 0, 0, 1, 1, 0],
+             [1, 0, 0, 1, 0, 0, 0, 1, 0, 1]]
+
+
+def pack(bits: Tuple[int, ...]) -> int:
+    """
+    Packs a tuple of bits into an integer, the first bit being the most significant one
+
+    Args:
+        bits (tuple): Tuple of bits
+    Returns:
+        int: Packed word
+    """
+    word = 0
+    for bit in bits:
+        word = (word << 1) | bit
+    return word
+
+
+def unpack(word: int, length: int) -> Tuple[int, ...]:
+    """
+    Unpacks an integer into a tuple of bits, the first bit being the most significant one
+
+    Args:
+        word (int): Packed word
+        length (int): Number of bits of the word
+    Returns:
+        tuple: Tuple of bits
+    """
+    return tuple((word >> (length - 1 - i)) & 1 for i in range(length))
+
 
 class HammingCode:
     """
     Provides decoding capabilities for the specified Hamming Code
     """
 
-    def __init__(self):
+    # Matrices and tables derived from every generator matrix used in the process, keyed by the matrix
+    cache = {}
+
+    def __init__(self, generator: List = None):
         """
         Initializes the class HammingCode with all values necessary.
+        Everything derived from the generator matrix is computed once per process and shared between instances.
+
+        Args:
+            generator (List): Non-systematic generator matrix G' (k rows, n columns) of the code to use,
+             the (10, 6) code of the bar code cards if not given
+        Raises:
+            ValueError: If the matrix does not describe a single-error-correcting code
         """
-        self.total_bits = 10  # n
-        self.data_bits = 6  # k
-        self.parity_bits = 4  # r
+        if generator is None:
+            generator = GENERATOR
+        key = tuple(tuple(row) for row in generator)
+        tables = HammingCode.cache.get(key)
+        if tables is None:
+            self.__build([list(row) for row in generator])
+            HammingCode.cache[key] = dict(self.__dict__)
+        else:
+            self.__dict__.update(tables)
+
+    def __build(self, gns: List):
+        """
+        Derives the matrices and lookup tables of the code from its generator matrix.
 
-        # Predefined non-systematic generator matrix G'
-    
-        gns = [[1, 1, 1, 0, 0, 0, 0, 1, 0, 0],
-                [0, 1, 0, 0, 1, 0, 0, 1, 0, 0],
-                [1, 0, 0, 1, 0, 1, 0, 0, 0, 0],
-                [0, 0, 0, 1, 0, 0, 1, 1, 0, 0],
-                [1, 1, 0, 1, 0, 0, 0, 1, 1, 0],
-                [1, 0, 0, 1, 0, 0, 0, 1, 0, 1]]
+        Args:
+            gns (List): Non-systematic generator matrix
+        """
+        self.total_bits = len(gns[0])  # n
+        self.data_bits = len(gns)  # k
+        self.parity_bits = self.total_bits - self.data_bits  # r
 
         # Convert non-systematic G' into systematic matrices G, H
         self.g = self.__convert_to_g(gns)
         self.h = self.__derive_h(self.g)
 
-    def __convert_to_g(self,gns: List):
+        # Lookup tables used by encode() and decode(), so no matrix operations are needed
+        self.g_rows = [pack(row) for row in self.g]
+        self.key_tables = self.__build_key_tables(self.h)
+        self.syndrome_table = self.__build_syndrome_table(self.h)
+        self.code_words = None
+        self.data_words = None
+        self.decode_table = None
+        if self.data_bits <= TABLE_BITS:
+            self.code_words = [self.__encode_word(w) for w in range(1 << self.data_bits)]
+            self.data_words = [unpack(w, self.data_bits) for w in range(1 << self.data_bits)]
+        if self.total_bits + 1 <= TABLE_BITS:
+            self.decode_table = [self.__decode_word(w) for w in range(1 << (self.total_bits + 1))]
+
+        # Array types used by the batch operations
+        self.word_typecode = 'H' if self.total_bits < 16 else 'Q'
+        self.data_typecode = 'b' if self.data_bits < 8 else 'h' if self.data_bits < 16 else 'q'
+        self.batch_tables = None
+        self.batch_code_tables = None
+        if numpy is not None:
+            self.__build_batch_tables()
+
+    def __convert_to_g(self, gns: List):
         """
-        Converts a non-systematic generator matrix into a systematic
+        Converts a non-systematic generator matrix into a systematic one using Gaussian elimination over GF(2)
 
         Args:
             gns (List): Non-systematic generator matrix
         Returns:
             list: Converted systematic generator matrix
+        Raises:
+            ValueError: If the matrix cannot be converted using row operations only
         """
+        gen = gns
+        for col in range(len(gen)):
+            pivot = col
+            while pivot < len(gen) and gen[pivot][col] == 0:
+                pivot += 1
+            if pivot == len(gen):
+                raise ValueError("Generator matrix cannot be brought into systematic form")
+            gen[col], gen[pivot] = gen[pivot], gen[col]
+            for row in range(len(gen)):
+                if row != col and gen[row][col] == 1:
+                    gen[row] = [x ^ y for x, y in zip(gen[row], gen[col])]
+        return gen
 
-        # REPLACE "pass" WITH YOUR IMPLEMENTATION
-
-        k = 10
-
-        for K in range(k):
-            gns[2][K] = abs(gns[2][K] - gns[0][K]) % 2
-            gns[4][K] = abs(gns[4][K] - gns[0][K]) % 2
-            gns[5][K] = abs(gns[5][K] - gns[0][K]) % 2
-
-        for K in range(k):
-            gns[0][K] = abs(gns[0][K] - gns[1][K]) % 2
-            gns[2][K] = abs(gns[2][K] - gns[1][K]) % 2
-            gns[5][K] = abs(gns[5][K] - gns[1][K]) % 2
-
-        for K in range(k):
-            gns[0][K] = abs(gns[0][K] - gns[2][K]) % 2
-            gns[4][K] = abs(gns[4][K] - gns[2][K]) % 2
-            gns[5][K] = abs(gns[5][K] - gns[2][K]) % 2
-
-        for K in range(k):
-            gns[0][K] = abs(gns[0][K] - gns[3][K]) % 2
-            gns[2][K] = abs(gns[2][K] - gns[3][K]) % 2
-
-        for K in range(k):
-            gns[1][K] = abs(gns[1][K] - gns[4][K]) % 2
-            gns[2][K] = abs(gns[2][K] - gns[4][K]) % 2
-
-        for K in range(k):
-            gns[0][K] = abs(gns[0][K] - gns[5][K]) % 2
-            gns[1][K] = abs(gns[1][K] - gns[5][K]) % 2
-            gns[4][K] = abs(gns[4][K] - gns[5][K]) % 2
-        return gns   
-
-    
     def __derive_h(self, g: List):
         """
         This method executes all steps necessary to derive H from G.
 
         Args:
-            g (List):
+            g (List): Systematic generator matrix
         Returns:
-            list:
+            list: Derived parity-check matrix
         """
+        #Getting Parity matrix parity_mat from G
+        parity_mat = [row[self.data_bits:] for row in g]
 
-        # REPLACE "pass" WITH YOUR IMPLEMENTATION
-        #Getting Parity matrix parity_mat from G 
-        parity_mat = [row[6:] for row in g]
-        
         #Getting identity matrix identity_mat(n-k)
-        identity_mat = [[1 if a == b else 0 for b in range(4)] for a in range(4)]
+        identity_mat = [[1 if a == b else 0 for b in range(self.parity_bits)] for a in range(self.parity_bits)]
 
         # Build H mat from parit_mat and identity_mat in the format [H] = [parity_mat(transpose) | identity_mat]
         parity_mat_trans = [list(t) for t in zip(*parity_mat)]
         h_mat = [x+y for x, y in zip(parity_mat_trans, identity_mat)]
-        
+
         return h_mat
 
+    def __build_key_tables(self, h: List):
+        """
+        Builds the partial syndrome tables for chunks of up to 8 bits of a codeword without its overall parity bit.
+        Each entry holds the syndrome shifted one bit to the left plus the parity of the chunk.
 
+        Args:
+            h (List): Parity-check matrix
+        Returns:
+            list: (shift, mask, table) for every chunk, starting with the most significant one
+        """
+        columns = [(pack(col) << 1) | 1 for col in zip(*h)]
+        chunks = -(-self.total_bits // 8)
+        width = -(-self.total_bits // chunks)
+        tables = []
+        for start in range(0, self.total_bits, width):
+            chunk = columns[start:start + width]
+            table = []
+            for bits in range(1 << len(chunk)):
+                key = 0
+                for i in range(len(chunk)):
+                    if bits & (1 << (len(chunk) - 1 - i)):
+                        key ^= chunk[i]
+                table.append(key)
+            tables.append((self.total_bits - start - len(chunk), (1 << len(chunk)) - 1, table))
+        return tables
+
+    def __build_syndrome_table(self, h: List):
+        """
+        Builds the table mapping a syndrome and the overall parity to the correction to apply.
 
-    def encode(self, source_word: Tuple[int, ...]) -> Tuple[int, ...]:
+        Args:
+            h (List): Parity-check matrix
+        Returns:
+            list: (mask of the data bit to flip, HCResult) indexed by (syndrome << 1) | parity
+        Raises:
+            ValueError: If the columns of H are not unique, so single-bit errors cannot be located
+        """
+        table = [(0, HCResult.UNCORRECTABLE)] * (1 << (self.parity_bits + 1))
+        table[0] = (0, HCResult.VALID)
+        # Only the overall parity bit is wrong
+        table[1] = (0, HCResult.CORRECTED)
+        for pos, col in enumerate(zip(*h)):
+            key = (pack(col) << 1) | 1
+            if table[key][1] != HCResult.UNCORRECTABLE:
+                raise ValueError("Parity-check matrix columns must be non-zero and unique")
+            flip = 1 << (self.data_bits - 1 - pos) if pos < self.data_bits else 0
+            table[key] = (flip, HCResult.CORRECTED)
+        return table
+
+    def __build_batch_tables(self):
+        """
+        Builds the NumPy versions of the matrices and tables used by the batch operations.
+        """
+        uncorrectable = RESULT_CODES.index(HCResult.UNCORRECTABLE)
+        self.batch_tables = (
+            numpy.array(self.h, dtype=numpy.int64).T,
+            numpy.array([flip for flip, _ in self.syndrome_table], dtype=numpy.int64),
+            numpy.array([RESULT_CODES.index(result) for _, result in self.syndrome_table], dtype=numpy.int8),
+            uncorrectable
+        )
+        self.batch_code_tables = (
+            numpy.array(self.g, dtype=numpy.int64),
+            None if self.code_words is None else numpy.array(self.code_words, dtype=self.word_typecode)
+        )
+
+    def encode(self, source_word: Union[int, Tuple[int, ...]]) -> Union[None, int, Tuple[int, ...]]:
         """
         Encodes the given word and returns the new codeword as tuple.
+        If the word is given as a packed integer, the codeword is returned as a packed integer too.
 
         Args:
-            source_word (tuple): m-tuple (length depends on number of data bits)
+            source_word (tuple): m-tuple (length depends on number of data bits) or packed integer
         Returns:
-            tuple: n-tuple (length depends on number of total bits)
+            tuple: n-tuple (length depends on number of total bits) or packed integer
         """
-
-        # REPLACE "pass" WITH YOUR IMPLEMENTATION
-        if len(source_word) != 6:
+        if isinstance(source_word, int):
+            return self.encode_word(source_word)
+        if len(source_word) != self.data_bits:
             return None
-         
-        gns = self.g
-        code_word = []
+        return unpack(self.encode_word(pack(source_word)), self.total_bits + 1)
 
-        #Getting transpose of matrix G' for multiplication 
-        gns_trans = [list(t) for t in zip(*gns)]
-        #print(gns_trans)
-        
+    def encode_word(self, source_word: int) -> Union[None, int]:
+        """
+        Encodes a data word packed into an integer.
 
-        #performs an element-wise multiplication of the transposed matrix gns_trans with source_word
-        temp_mat = [[x&y for x, y in zip(list(source_word), gns_trans[i])] for i in range(len(gns_trans))]
+        Args:
+            source_word (int): Packed data word
+        Returns:
+            int: Packed codeword including the overall parity bit, or None if the word has too many bits
+        """
+        if self.code_words is not None and 0 <= source_word < len(self.code_words):
+            return self.code_words[source_word]
+        if not 0 <= source_word < 1 << self.data_bits:
+            return None
+        return self.__encode_word(source_word)
 
-        #XOR reduction on the elements of each row to obtain the individual binary elements of the code_word
-        for row in temp_mat:
-            code_word.append(reduce(lambda a,b: a^b, row))
+    def __encode_word(self, source_word: int) -> int:
+        """
+        Computes the codeword of a data word packed into an integer using the rows of G.
 
+        Args:
+            source_word (int): Packed data word
+        Returns:
+            int: Packed codeword including the overall parity bit
+        """
+        code_word = 0
+        for i, row in enumerate(self.g_rows):
+            if source_word & (1 << (self.data_bits - 1 - i)):
+                code_word ^= row
         # Adding overall parity bit
-        code_word.append(reduce(lambda x,y: 1 if(x^y) else 0, code_word))
-        return tuple(code_word)
-
+        return (code_word << 1) | (bin(code_word).count("1") & 1)
 
+    def encode_batch(self, source_words):
+        """
+        Encodes a whole program at once.
 
-    def decode(self, encoded_word: Tuple[int, ...]) -> Tuple[Union[None, Tuple[int, ...]], HCResult]:
+        Args:
+            source_words: Sequence of data words (tuples or packed integers), NumPy array of packed data words,
+             or N x k NumPy array of bits
+        Returns:
+            Packed codewords as an array of unsigned integers (NumPy array for NumPy input),
+             or an N x (n + 1) NumPy array of bits for an N x k array of bits
+        Raises:
+            ValueError: If a word is not a valid data word
+        """
+        if numpy is not None and isinstance(source_words, numpy.ndarray):
+            g, code_words = self.batch_code_tables
+            if source_words.ndim == 2:
+                if source_words.shape[1] != self.data_bits:
+                    raise ValueError("Expected " + str(self.data_bits) + " bits per data word, got " +
+                                     str(source_words.shape[1]))
+                code = (source_words.astype(numpy.int64) @ g) & 1
+                return numpy.hstack([code, code.sum(axis=1, keepdims=True) & 1]).astype(numpy.uint8)
+            if source_words.size and not (0 <= source_words.min() and source_words.max() < 1 << self.data_bits):
+                raise ValueError("Data words must fit in " + str(self.data_bits) + " bits")
+            if code_words is not None:
+                return code_words[source_words]
+            bits = (source_words.astype(numpy.int64)[:, None] >> numpy.arange(self.data_bits - 1, -1, -1)) & 1
+            weights = numpy.uint64(1) << numpy.arange(self.total_bits, -1, -1, dtype=numpy.uint64)
+            return (self.encode_batch(bits).astype(numpy.uint64) @ weights).astype(self.word_typecode)
+
+        code_words = array(self.word_typecode)
+        for word in source_words:
+            if not isinstance(word, int):
+                word = pack(word) if len(word) == self.data_bits else -1
+            code_word = self.encode_word(word)
+            if code_word is None:
+                raise ValueError("Invalid data word: " + str(word))
+            code_words.append(code_word)
+        return code_words
+
+    def decode(self, encoded_word: Union[int, Tuple[int, ...]]) -> Tuple[Union[None, int, Tuple[int, ...]], HCResult]:
         """
         Checks the channel alphabet word for errors and attempts to decode it.
+        If the word is given as a packed integer, the decoded word is returned as a packed integer too.
         Args:
-            encoded_word (tuple): n-tuple (length depends on number of total bits)
+            encoded_word (tuple): n-tuple (length depends on number of total bits) or packed integer
         Returns:
             Union: (m-tuple, HCResult) or (None, HCResult)(length depends on number of data bits)
         """
+        if isinstance(encoded_word, int):
+            return self.decode_word(encoded_word)
+        if len(encoded_word) != self.total_bits + 1:
+            return tuple([None, HCResult.UNCORRECTABLE])
 
-        # REPLACE "pass" WITH YOUR IMPLEMENTATION
+        data, result = self.decode_word(pack(encoded_word))
+        if data is None:
+            return None, result
+        if self.data_words is not None:
+            return self.data_words[data], result
+        return unpack(data, self.data_bits), result
 
-        if len(encoded_word) != 11:
-            return tuple([None, HCResult.UNCORRECTABLE])
+    def decode_word(self, encoded_word: int) -> Tuple[Union[None, int], HCResult]:
+        """
+        Decodes a codeword packed into an integer.
 
-        h = self.h
-        syndrome = []
-        code_word_r = list(encoded_word)
-        overall_parity_bit = sum(code_word_r)
-        code_word_r.pop()
-        mid_result = [[x&y for x, y in zip(code_word_r, h[i])] for i in range(len(h))]
-        for row in mid_result:
-            syndrome.append(reduce(lambda a,b: a^b, row))
-        # Getting transpose of H to compare with Syndrome to identify errors
-        h_trans = [list(t) for t in zip(*self.h)]
-        #print ("H_trans = ", h_trans)
-        if all([v == 0 for v in syndrome]) and overall_parity_bit % 2==0:
-          return tuple(code_word_r[0:6]), HCResult.VALID                          
-        elif all([v == 0 for v in syndrome]) and overall_parity_bit % 2==1:
-          return tuple(code_word_r[0:6]), HCResult.CORRECTED                                                               
-        elif syndrome in h_trans and overall_parity_bit % 2==1:
-            for k in range(0,10):
-                if syndrome==h_trans[k]:
-                    code_word_r[k]=(0 if code_word_r[k]==1 else 1)
-            return tuple(code_word_r[0:6]), HCResult.CORRECTED
-        else:
-            return None, HCResult.UNCORRECTABLE
\ No newline at end of file
+        Args:
+            encoded_word (int): Packed codeword including the overall parity bit
+        Returns:
+            Union: (packed data word, HCResult) or (None, HCResult)
+        """
+        if self.decode_table is not None and 0 <= encoded_word < len(self.decode_table):
+            return self.decode_table[encoded_word]
+        return self.__decode_word(encoded_word)
+
+    def decode_soft(self, encoded_word: Tuple[Union[None, int], ...], confidences: Tuple[float, ...] = None,
+                    threshold: float = 1.0) -> Tuple[Union[None, Tuple[int, ...]], HCResult, Tuple[int, ...]]:
+        """
+        Decodes a word read with erased bits (None) and optionally a confidence for every bit.
+        Erased bits are filled in from the distance of the code. If the word is still uncorrectable,
+        the least confident bits below the threshold are erased too, one at a time,
+        up to MAX_ERASURES erased bits in total. The word is then only accepted if the erased bits
+        alone lead to a codeword, as also correcting a confident bit would hide a double error.
+
+        Args:
+            encoded_word (tuple): n-tuple of 0, 1 or None for an erased bit
+            confidences (tuple): Confidence of every bit, between 0 and 1
+            threshold (float): Only bits less confident than this are erased
+        Returns:
+            tuple: (m-tuple or None, HCResult, indexes of the bits that were filled in or flipped)
+        """
+        length = self.total_bits + 1
+        if len(encoded_word) != length:
+            return None, HCResult.UNCORRECTABLE, ()
+
+        erased = [i for i, bit in enumerate(encoded_word) if bit is None]
+        code_word = self.__fill_erasures(encoded_word, erased)
+        if code_word is None and confidences is not None:
+            doubtful = sorted((i for i in range(length) if encoded_word[i] is not None and confidences[i] < threshold),
+                              key=lambda i: confidences[i])
+            for i in doubtful[:MAX_ERASURES - len(erased)]:
+                erased.append(i)
+                code_word = self.__fill_erasures(encoded_word, erased, correct=False)
+                if code_word is not None:
+                    break
+        if code_word is None:
+            return None, HCResult.UNCORRECTABLE, ()
+
+        code_bits = unpack(code_word, length)
+        fixed = tuple(i for i in range(length) if encoded_word[i] != code_bits[i])
+        data = self.decode_word(code_word)[0]
+        data = self.data_words[data] if self.data_words is not None else unpack(data, self.data_bits)
+        return data, HCResult.CORRECTED if fixed else HCResult.VALID, fixed
+
+    def __fill_erasures(self, encoded_word: Tuple[Union[None, int], ...], erased: List[int],
+                        correct: bool = True) -> Union[None, int]:
+        """
+        Tries every value of the erased bits and keeps the codeword they lead to, if it is unique.
+        A single erased bit also leaves room to correct one more error, if allowed.
+
+        Args:
+            encoded_word (tuple): n-tuple of 0, 1 or None for an erased bit
+            erased (List): Indexes of the bits to treat as erased
+            correct (bool): Whether a bit outside the erased ones may be corrected too
+        Returns:
+            int: Packed codeword, or None if there is no unique candidate
+        """
+        if len(erased) > MAX_ERASURES:
+            return None
+        last = len(encoded_word) - 1
+        masks = [1 << (last - i) for i in erased]
+        base = pack(tuple(bit or 0 for bit in encoded_word))
+        for mask in masks:
+            base &= ~mask
+        valid = set()
+        corrected = set()
+        for fill in range(1 << len(masks)):
+            candidate = base
+            for j, mask in enumerate(masks):
+                if fill >> j & 1:
+                    candidate |= mask
+            data, result = self.decode_word(candidate)
+            if result == HCResult.VALID:
+                valid.add(candidate)
+            elif result == HCResult.CORRECTED:
+                corrected.add(self.encode_word(data))
+        if len(valid) == 1:
+            return valid.pop()
+        if correct and not valid and len(masks) <= 1 and len(corrected) == 1:
+            return corrected.pop()
+        return None
+
+    def __decode_word(self, encoded_word: int) -> Tuple[Union[None, int], HCResult]:
+        """
+        Decodes a codeword packed into an integer using the syndrome tables.
+
+        Args:
+            encoded_word (int): Packed codeword including the overall parity bit
+        Returns:
+            Union: (packed data word, HCResult) or (None, HCResult)
+        """
+        if not 0 <= encoded_word < 1 << (self.total_bits + 1):
+            return None, HCResult.UNCORRECTABLE
+
+        # Syndrome and overall parity of every chunk of the word are combined with a XOR
+        code_word = encoded_word >> 1
+        key = encoded_word & 1
+        for shift, mask, table in self.key_tables:
+            key ^= table[(code_word >> shift) & mask]
+        flip, result = self.syndrome_table[key]
+        if result == HCResult.UNCORRECTABLE:
+            return None, result
+        return (encoded_word >> (self.parity_bits + 1)) ^ flip, result
+
+    def decode_batch(self, encoded_words) -> Tuple[array, array]:
+        """
+        Decodes many codewords at once.
+        With NumPy available, an N x (n + 1) array of bits or a buffer of packed codewords is decoded in a single
+        vectorized pass. Without it, or for other sequences, every word is decoded through decode_word().
+
+        Args:
+            encoded_words: N x (n + 1) NumPy array of bits, NumPy array of packed codewords, bytes holding every
+             codeword as a big-endian 16-bit integer (64-bit for codewords longer than 16 bits),
+             or sequence of codewords (tuples or packed integers)
+        Returns:
+            tuple: (packed data words, -1 if uncorrectable; result codes, see RESULT_CODES) as NumPy arrays
+             for NumPy input and for buffers when NumPy is available, as arrays of signed integers otherwise
+        """
+        if isinstance(encoded_words, (bytes, bytearray, memoryview)):
+            if numpy is not None:
+                words = numpy.frombuffer(encoded_words, dtype='>' + self.word_typecode)
+                bits = (words[:, None] >> numpy.arange(self.total_bits, -1, -1, dtype=words.dtype)) & 1
+                data, codes = self.__decode_matrix(bits)
+                invalid = (words >> (self.total_bits + 1)) != 0
+                codes[invalid] = RESULT_CODES.index(HCResult.UNCORRECTABLE)
+                data[invalid] = -1
+                return data, codes
+            encoded_words = array(self.word_typecode, bytes(encoded_words))
+            if sys.byteorder == 'little':
+                encoded_words.byteswap()
+        elif numpy is not None and isinstance(encoded_words, numpy.ndarray):
+            if encoded_words.ndim == 2:
+                return self.__decode_matrix(encoded_words)
+            return self.decode_batch(encoded_words.astype('>' + self.word_typecode).tobytes())
+
+        data = array(self.data_typecode)
+        codes = array('b')
+        result_codes = {result: code for code, result in enumerate(RESULT_CODES)}
+        for word in encoded_words:
+            if not isinstance(word, int):
+                word = pack(word) if len(word) == self.total_bits + 1 else -1
+            value, result = self.decode_word(word)
+            data.append(-1 if value is None else value)
+            codes.append(result_codes[result])
+        return data, codes
+
+    def __decode_matrix(self, bits):
+        """
+        Decodes the rows of an N x (n + 1) NumPy array of bits using the parity-check matrix.
+
+        Args:
+            bits (numpy.ndarray): One codeword per row
+        Returns:
+            tuple: (packed data words, result codes) as NumPy arrays
+        """
+        if bits.shape[1] != self.total_bits + 1:
+            raise ValueError("Expected " + str(self.total_bits + 1) + " bits per codeword, got " +
+                             str(bits.shape[1]))
+        h_trans, flips, results, uncorrectable = self.batch_tables
+        bits = bits.astype(numpy.int64)
+        syndrome = (bits[:, :self.total_bits] @ h_trans) & 1
+        key = ((syndrome @ (1 << numpy.arange(self.parity_bits - 1, -1, -1))) << 1) | (bits.sum(axis=1) & 1)
+        codes = results[key]
+        data = (bits[:, :self.data_bits] @ (1 << numpy.arange(self.data_bits - 1, -1, -1))) ^ flips[key]
+        data = data.astype(self.data_typecode)
+        data[codes == uncorrectable] = -1
+        return data, codes
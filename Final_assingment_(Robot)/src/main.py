@@ -12,135 +12,309 @@ import and change the name to main.run() function.
 Code has been developed using the modular design concepts of coed desing
 """
 
-from hamming_code import HammingCode, HCResult
-from stack_machine import StackMachine, SMState
+import argparse
+import os
+import queue
+import sys
+import threading
+from time import sleep
+from hamming_code import HCResult
+from stack_machine import SMState
+from pipeline import LineEvent, Pipeline
 from robot import *
+from devices import BACKENDS, BACKEND_VARIABLE, load
+from scan import VOTE_METHODS, calibrate as calibrate_colors, is_red, segment_soft
+from speech import Announcer, Priority, Verbosity
+from buttons import ButtonEvents
+from recorder import Recorder
+from timing import format_summary, tracer
 
 # from debug import run
 
-
-def run():
+# Seconds between checks of whether the card stopped, while waiting for a button
+STOP_CHECK = 0.5
+
+# Environment variable selecting the output profile when --verbosity is not given
+VERBOSITY_VARIABLE = "ROBOT_VERBOSITY"
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Reads bar code cards and runs them on the stack machine")
+    parser.add_argument("--verbosity", choices=[level.name.lower() for level in Verbosity],
+                        default=os.environ.get(VERBOSITY_VARIABLE, "full").lower(),
+                        help="messages to speak, the rest are logged (default: $" + VERBOSITY_VARIABLE + " or full)")
+    parser.add_argument("--log", help="file to log the messages that are not spoken to, stdout if -")
+    parser.add_argument("--backend", choices=BACKENDS,
+                        help="devices to use, sim for the simulator (default: $" + BACKEND_VARIABLE + " or ev3)")
+    parser.add_argument("--record", help="new session log to write every sensor sample to, e.g. ../logs/session.bin")
+    parser.add_argument("--samples", type=int, default=1,
+                        help="readings taken on every bit cell, the bit is voted from them (default: 1)")
+    parser.add_argument("--vote", choices=VOTE_METHODS, default="majority",
+                        help="how the readings of a cell are combined (default: majority)")
+    parser.add_argument("--sweep", action="store_true",
+                        help="read every line with a single continuous sweep instead of stopping at every bit cell")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="read the calibration card before the first card to fit the color classifier")
+    parser.add_argument("--trace", help="Chrome trace file to write the timing spans to, a summary is printed after every card")
+    simulation = parser.add_argument_group("simulator", "only with the sim backend")
+    simulation.add_argument("--card", help="text file with the card to read, a line of 11 binary digits for every "
+                                           "line of the card (default: the example program)")
+    simulation.add_argument("--speedup", type=float,
+                            help="simulated seconds in every second of wall time, inf for no waits (default: 1)")
+    simulation.add_argument("--presses", type=lambda names: [name for name in names.split(",") if name],
+                            help="comma separated buttons pressed in order as the program waits for them, "
+                                 "e.g. enter,backspace (default: none)")
+    args = parser.parse_args(argv)
+    if args.verbosity.upper() not in Verbosity.__members__:
+        parser.error("invalid $" + VERBOSITY_VARIABLE + ": " + args.verbosity)
+    if args.samples < 1:
+        parser.error("argument --samples: must be at least 1")
+    if args.record is not None and os.path.exists(args.record):
+        parser.error("argument --record: " + args.record + " exists, every session needs a new log")
+    if (args.backend or os.environ.get(BACKEND_VARIABLE, "ev3")) != "sim":
+        for option in ("card", "speedup", "presses"):
+            if getattr(args, option) is not None:
+                parser.error("argument --" + option + ": only with the sim backend")
+    elif args.speedup is not None and args.speedup <= 0:
+        parser.error("argument --speedup: must be positive")
+    return args
+
+
+def run(argv: list = None):
     # the execution of all code shall be started from within this function
-    robot = Robot()
-    decoder = HammingCode()
-    sm = StackMachine()
-    cs = ev3.ColorSensor("in4")
-    cs.mode = 'RGB-RAW'
-    btn = ev3.Button()
-    spk = ev3.Sound()
+    args = parse_args(argv)
+    log = None
+    if args.log == "-":
+        log = sys.stdout
+    elif args.log is not None:
+        log = open(args.log, "a")
+    devices = load(args.backend)
+    if devices.__name__ == "simulator":
+        devices.reset(card=devices.EXAMPLE_CARD if args.card is None else devices.load_card(args.card),
+                      speedup=args.speedup or 1, presses=args.presses or ())
+    recorder = Recorder(args.record) if args.record is not None else None
+    robot = Robot(samples=args.samples, method=args.vote, devices=devices, recorder=recorder)
+    pipeline = Pipeline()
+    btn = ButtonEvents(robot.devices.Button())
+    spk = Announcer(robot.devices.Sound(), verbosity=Verbosity[args.verbosity.upper()], log=log)
+    tracer.enabled = args.trace is not None
+    if args.calibrate:
+        calibrate(robot, spk, btn)
     cont = True
-    while cont:
-        read_card(robot, decoder, sm, cs, spk, btn)
-        
-        cont = next_card(spk, btn)
-        
-
-if __name__ == '__main__':
-    run()
-
-
-def read_card(robot: Robot, decoder: HammingCode, sm: StackMachine, cs: ev3.ColorSensor, spk: ev3.Sound, btn: ev3.Button):
-    for _ in range (10):
-            value = cs.bin_data("hhhh")
-            while not value[0] > value[1] and not value[0] > value[2]:
+    try:
+        while cont:
+            read_card(robot, pipeline, spk, btn, args.sweep)
+            report_card()
+
+            cont = next_card(spk, btn)
+    finally:
+        # Also reached when operate() exits after the last line
+        if tracer.enabled:
+            report_card()
+            tracer.export(args.trace)
+        if log is not None and log is not sys.stdout:
+            log.close()
+    spk.close()
+    if recorder is not None:
+        recorder.close()
+
+
+def report_card():
+    if tracer.enabled:
+        summary = tracer.card_summary()
+        if summary["spans"] or summary["counters"]:
+            print("Card timings:\n" + format_summary(summary))
+
+
+def read_card(robot: Robot, pipeline: Pipeline, spk: Announcer, btn: ButtonEvents, sweep: bool = False):
+    # Lines are scanned on a separate thread, so the next line is being read while this one is executed
+    lines = queue.Queue()
+    stop = threading.Event()
+    scanner = threading.Thread(target=scan_card, args=(robot, pipeline, spk, btn, lines, stop, sweep),
+                               daemon=True)
+    scanner.start()
+    event = None
+    line = lines.get()
+    while line is not None:
+        if isinstance(line, Exception):
+            scanner.join()
+            raise line
+        event = execute_line(pipeline, spk, *line)
+
+        if event.state == SMState.STOPPED or event.state == SMState.ERROR:
+            stop.set()
+            scanner.join()
+        operate(spk, robot, event)
+
+        announce_line(event, spk)
+
+        line = lines.get()
+
+    announce_card(event, spk)
+
+
+def scan_card(robot: Robot, pipeline: Pipeline, spk: Announcer, btn: ButtonEvents, lines: queue.Queue,
+              stop: threading.Event, sweep: bool = False):
+    # Puts every line read, an exception that ends the scanning, and None once the card is done
+    try:
+        for _ in range (10):
+            if stop.is_set():
+                break
+            if not is_red(robot.sensor.bin_data("hhhh")):
                 robot.readjust_barcode()
-                if not value[0] > value[1] and not value[0] > value[2]:
-                    break
-            
-            encoded_word = read_line(robot)
 
-            spk.speak("Encoded word is: " + str(encoded_word))
-            sleep(12)
-            
-            res = decode_line(decoder, spk, encoded_word, robot, btn)
-
-            spk.speak("Decoded word is: " + str(res[0]))
-            sleep(10)
-
-            operate(sm, spk, robot, res)
-
-            spk_operation(sm, spk)
-            
-            if not isinstance(sm.top(), str) and sm.top() is not None:
-                spk.speak("Top value is: " + str(to_int(sm.top())))
-            elif sm.top() is not None:
-                spk.speak("Top value is: " + sm.top())
-
-            sleep(8)
+            encoded_word, confidences = read_line(robot, sweep)
+            # Rescanning needs the card still on this line, so it is decided here and not by the executing stage
+            if pipeline.decoder.decode_soft(tuple(encoded_word), confidences)[1] == HCResult.UNCORRECTABLE:
+                line = uncorrectable(pipeline, spk, encoded_word, robot, btn, confidences, stop, sweep)
+                if line is None:
+                    break
+                encoded_word, confidences = line
+            lines.put((encoded_word, confidences))
 
             next(robot)
+    except Exception as error:
+        lines.put(error)
+    finally:
+        lines.put(None)
+
+
+@tracer.timed("read_line")
+def read_line(robot: Robot, sweep: bool = False) -> tuple:
+    # Returns the bits of the line and the confidence of every bit
+    if robot.recorder is not None:
+        robot.recorder.next_scan(sweep)
+    if sweep:
+        encoded_word, confidences = segment_soft(robot.sweep_line())
+        encoded_word = list(encoded_word)
+    else:
+        cells = []
+        robot.sensor_step()
+        for _ in range(10):
+            cells.append(robot.read_bit())
+            robot.sensor_step()
+        cells.append(robot.read_bit())
+        encoded_word = [bit for bit, _ in cells]
+        confidences = tuple(confidence for _, confidence in cells)
+    if tracer.enabled and None in encoded_word:
+        tracer.count("none_bits", encoded_word.count(None))
+    return encoded_word, confidences
+
+
+def execute_line(pipeline: Pipeline, spk: Announcer, encoded_word: list, confidences: tuple = None) -> LineEvent:
+    spk.speak("Encoded word is: " + str(encoded_word), Priority.LOW, "encoded")
+    if confidences is not None and min(confidences) < 1:
+        spk.speak("Uncertain bits: " + uncertain_bits(encoded_word, confidences), Priority.LOW, "uncertain")
+
+    event = decode_line(pipeline, spk, encoded_word, confidences)
+
+    spk.speak("Decoded word is: " + str(event.data), Priority.LOW, "decoded")
+    return event
+
+
+def uncertain_bits(encoded_word: list, confidences: tuple) -> str:
+    return ", ".join("bit {} is {} at {:.0%}".format(i, bit, confidence)
+                     for i, (bit, confidence) in enumerate(zip(encoded_word, confidences)) if confidence < 1)
+
+
+def announce_line(event: LineEvent, spk: Announcer):
+    spk_operation(event, spk)
+
+    if event.top is not None:
+        spk.speak("Top value is: " + top_value(event), Priority.NORMAL, "top")
+
+
+def announce_card(event: LineEvent, spk: Announcer):
+    if event is not None and event.top is not None:
+        spk.speak("Card finished, top value is: " + top_value(event), Priority.HIGH, level=Verbosity.SUMMARY)
+
+
+@tracer.timed("decode_line")
+def decode_line(pipeline: Pipeline, spk: Announcer, encoded_word: list, confidences: tuple = None) -> LineEvent:
+    event = pipeline.feed(tuple(encoded_word), confidences)
+    if event.result == HCResult.VALID:
+        spk.speak("Valid code", Priority.LOW, "result")
+    elif event.result == HCResult.CORRECTED:
+        spk.speak("Corrected code", Priority.LOW, "result")
+    return event
+
+
+@tracer.timed("uncorrectable")
+def uncorrectable(pipeline: Pipeline, spk: Announcer, encoded_word: list, robot: Robot, btn: ButtonEvents,
+                  confidences: tuple = None, stop: threading.Event = None, sweep: bool = False):
+    # Returns the line once it is read correctably, None if the card stops meanwhile
+    while pipeline.decoder.decode_soft(tuple(encoded_word), confidences)[1] == HCResult.UNCORRECTABLE:
+        if stopped(stop):
+            return None
+        announce_uncorrectable(spk)
+        tracer.count("rescans")
+        encoded_word, confidences = repeat_lecture(robot, stop, sweep)
+        res = pipeline.decoder.decode_soft(tuple(encoded_word), confidences)
+        if res[1] == HCResult.UNCORRECTABLE and not stopped(stop):
+            robot.sensor_reset()
+            announce_uncorrectable(spk, prompt=True)
+            spk.wait()
+            btn.clear()
+            while btn.wait_for("enter", timeout=STOP_CHECK) is None:
+                if stopped(stop):
+                    return None
+            spk.beep()
+    return encoded_word, confidences
 
 
-def read_line(robot: Robot) -> list:
-    encoded_word = []
-    robot.sensor_step()
-    for _ in range(10):
-        encoded_word.append(robot.read_value())
-        robot.sensor_step()
-    encoded_word.append(robot.read_value())
-    return encoded_word
-
-
-def decode_line(decoder: HammingCode, spk: ev3.Sound, encoded_word: list, robot: Robot, btn: ev3.Button) -> tuple:
-    res = decoder.decode(tuple(encoded_word))
-    if res[1] == HCResult.VALID:
-        spk.speak("Valid code")
-        sleep(3)
-        return res
-    elif res[1] == HCResult.CORRECTED:
-        spk.speak("Corrected code")
-        sleep(4)
-        return res
-    else:
-        return uncorrectable(decoder, spk, encoded_word, robot, btn)
+def stopped(stop: threading.Event) -> bool:
+    return stop is not None and stop.is_set()
 
 
-def uncorrectable(decoder: HammingCode, spk: ev3.Sound, encoded_word: list, robot: Robot, btn: ev3.Button) -> tuple:
-    spk.speak("Uncorrectable code")
-    sleep(8)
-    encoded_word = repeat_lecture(robot)
-    res = decoder.decode(tuple(encoded_word))
-    if res[1] == HCResult.UNCORRECTABLE:
-        robot.sensor_reset()
-        spk.speak("Uncorrectable code, adjust card and press enter")
-        sleep(8)
-        while True:
-            if btn.enter:
-                spk.beep()
-                break
-            sleep(0.05)
-        return decode_line(decoder, spk, encoded_word, robot, btn)
+def announce_uncorrectable(spk: Announcer, prompt: bool = False):
+    # The prompt is said when a rescan is still uncorrectable, replays say the same as the robot
+    if prompt:
+        # Status of the lines is stale by now, program output and summaries are HIGH and kept
+        spk.flush(Priority.HIGH)
+        spk.speak("Uncorrectable code, adjust card and press enter", Priority.HIGH, level=Verbosity.ERRORS)
     else:
-        return decode_line(decoder, spk, encoded_word, robot, btn)
+        spk.speak("Uncorrectable code", Priority.NORMAL, "result", Verbosity.ERRORS)
 
 
-def repeat_lecture(robot: Robot) -> list:
+def repeat_lecture(robot: Robot, stop: threading.Event = None, sweep: bool = False) -> tuple:
+    # The pauses end early if the card stops
+    pause = sleep if stop is None else stop.wait
     robot.sensor_reset()
-    sleep(3)
+    pause(3)
     robot.readjust_barcode()
-    sleep(3)
-    return read_line(robot)
+    pause(3)
+    return read_line(robot, sweep)
 
 
-def operate(sm: StackMachine, spk: ev3.Sound, robot: Robot, res: tuple):
-    res = sm.do(res[0])
-    if res == SMState.STOPPED:
-        spk.speak("Stack machine stopped")
+@tracer.timed("operate")
+def operate(spk: Announcer, robot: Robot, event: LineEvent):
+    if event.state == SMState.STOPPED or event.state == SMState.ERROR:
+        announce_end(event, spk)
         robot.sensor_reset()
-        exit(0)
-    elif res == SMState.ERROR:
-        spk.speak("Stack machine got an error for invalid operation")
-        robot.sensor_reset()
-        exit(2)
+        spk.wait()
+        if robot.recorder is not None:
+            robot.recorder.close()
+        exit(0 if event.state == SMState.STOPPED else 2)
+
+
+def announce_end(event: LineEvent, spk: Announcer):
+    if event.state == SMState.STOPPED:
+        spk.speak("Stack machine stopped", Priority.HIGH, level=Verbosity.SUMMARY)
+    elif event.state == SMState.ERROR:
+        spk.speak("Stack machine got an error for invalid operation", Priority.HIGH, level=Verbosity.ERRORS)
+
 
+def spk_operation(event: LineEvent, spk: Announcer):
+    if event.op is not None:
+        spk.speak("Instruction: " + event.op, Priority.NORMAL, "op")
+    if event.op == "SPEAK" and event.spk is not None:
+        spk.speak(event.spk, Priority.HIGH, level=Verbosity.SUMMARY)
 
-def spk_operation(sm: StackMachine, spk: ev3.Sound):
-    if sm.op is not None:
-        spk.speak("Instruction: " + sm.op)
-        sleep(5)
-    if sm.op == "SPEAK" and sm.spk is not None:
-        spk.speak(sm.spk)
-        sleep(len(sm.spk) * 0.8)
+
+def top_value(event: LineEvent) -> str:
+    if isinstance(event.top, str):
+        return event.top
+    return str(to_int(event.top))
 
 
 def to_int(res: tuple) -> int:
@@ -152,16 +326,35 @@ def next(robot: Robot):
     robot.scroll_step()
 
 
-def next_card(spk: ev3.Sound, btn: ev3.Button) -> bool:
-    spk.speak("Press back to exit, enter to continue")
-    sleep(5)
-    while True:
-        if btn.backspace:
-            spk.beep()
-            sleep(1)
-            spk.beep()
-            return False
-        elif btn.enter:
-            spk.beep()
-            return True
-        sleep(0.05)
+def calibrate(robot: Robot, spk: Announcer, btn: ButtonEvents):
+    spk.speak("Insert the calibration card and press enter", Priority.HIGH, level=Verbosity.SUMMARY)
+    spk.wait()
+    btn.clear()
+    btn.wait_for("enter")
+    classifier = calibrate_colors(robot.read_references())
+    print("Color centroids: " + str(classifier.centroids))
+    if robot.recorder is not None:
+        # Replays classify the session with the same centroids
+        robot.recorder.record_calibration(classifier.centroids, classifier.ratio)
+    spk.speak("Calibrated, insert a card and press enter", Priority.HIGH, level=Verbosity.SUMMARY)
+    spk.wait()
+    btn.clear()
+    btn.wait_for("enter")
+    spk.beep()
+
+
+def next_card(spk: Announcer, btn: ButtonEvents) -> bool:
+    spk.speak("Press back to exit, enter to continue", Priority.HIGH, level=Verbosity.SUMMARY)
+    spk.wait()
+    btn.clear()
+    if btn.wait_for("backspace", "enter") == "backspace":
+        spk.beep()
+        sleep(1)
+        spk.beep()
+        return False
+    spk.beep()
+    return True
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""
+Decode-and-execute path shared by the robot and the offline tools.
+Raw 11-bit scan words go through the HammingCode decoder, valid words are
+executed on the StackMachine and every line produces a LineEvent.
+"""
+
+from collections import namedtuple
+from typing import Iterable, Iterator, Tuple, Union
+from hamming_code import HammingCode
+from stack_machine import StackMachine, SMState
+
+
+LineEvent = namedtuple('LineEvent', ['code', 'data', 'result', 'state', 'op', 'top', 'spk', 'fixed'])
+LineEvent.__doc__ = """
+Outcome of processing one line of a card.
+    code: Raw scan word, as given
+    data: Decoded word (same representation as code) or None if uncorrectable
+    result: HCResult of the decoding
+    state: SMState after executing the word, None if it was not executed
+    op: Operation performed by the stack machine
+    top: Top element of the stack afterwards
+    spk: Text produced by SPEAK
+    fixed: Indexes of the bits filled in or flipped by the decoder, None for packed words
+"""
+
+
+class Pipeline:
+    """
+    Decodes raw scan words and executes the valid ones on a stack machine
+    """
+
+    def __init__(self, decoder: HammingCode = None, sm: StackMachine = None) -> None:
+        self.decoder = decoder if decoder is not None else HammingCode()
+        self.sm = sm if sm is not None else StackMachine()
+
+    def feed(self, code: Union[int, Tuple[int, ...]], confidences: Tuple[float, ...] = None) -> LineEvent:
+        """
+        Processes a single line. Uncorrectable words are not executed, so the line can be scanned again.
+        Scans given as tuples are soft decoded: unreadable (None) bits are filled in and,
+        with confidences, the least confident bits are tried before giving up.
+
+        Args:
+            code: Raw scan word, as an 11-tuple or packed into an integer
+            confidences: Confidence of every bit of a tuple scan, between 0 and 1
+        Returns:
+            LineEvent: Outcome of the line
+        """
+        if isinstance(code, int):
+            data, result = self.decoder.decode(code)
+            fixed = None
+        else:
+            data, result, fixed = self.decoder.decode_soft(code, confidences)
+        if data is None:
+            return LineEvent(code, None, result, None, None, None, None, fixed)
+        sm = self.sm
+        state = sm.do(data)
+        if state is None:
+            state = SMState.RUNNING
+        return LineEvent(code, data, result, state, sm.op, sm.top(), sm.spk, fixed)
+
+    def run(self, codes: Iterable[Union[int, Tuple[int, ...]]]) -> Iterator[LineEvent]:
+        """
+        Processes a stream of lines, yielding one event per line.
+        The stream is consumed lazily and ends after the stack machine stops or gets an error.
+
+        Args:
+            codes: Raw scan words, as 11-tuples or packed into integers
+        Yields:
+            LineEvent: Outcome of every line
+        """
+        for code in codes:
+            event = self.feed(code)
+            yield event
+            if event.state == SMState.STOPPED or event.state == SMState.ERROR:
+                return
+
+
+def process(codes: Iterable[Union[int, Tuple[int, ...]]]) -> Iterator[LineEvent]:
+    """
+    Auxiliary method used to process a stream of lines on a new stack machine
+    """
+    return Pipeline().run(codes)
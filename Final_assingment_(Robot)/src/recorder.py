@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+Recording of scan sessions: every raw color sensor sample is appended to a binary
+log as a fixed-width record, so sessions can be streamed back or memory-mapped to
+reproduce field failures and replay the decoding offline.
+
+A log is a HEADER followed by RECORD entries, all little-endian. Besides the
+samples, version 2 logs hold setting records with what is needed to read the
+samples as the robot did: the voting method, the scan mode and the calibration.
+"""
+
+import mmap
+import queue
+import struct
+import threading
+from collections import namedtuple
+from time import time
+from typing import Dict, Iterator, Optional, Sequence, Union
+from scan import COLORS, VOTE_METHODS
+
+
+MAGIC = b"RSCN"
+VERSION = 2
+# Versions that can be read, version 1 logs have no settings
+VERSIONS = (1, 2)
+# Magic, format version and record size
+HEADER = struct.Struct("<4sHH")
+# Timestamp, scan, line, sensor motor position, red, green, blue and bit of the sample (-1 if ambiguous).
+# Settings have SETTING as bit, their kind as position and their values as the color.
+RECORD = struct.Struct("<dHHhhhhbx")
+SETTING = -2
+
+# Kinds of settings: the voting method (index in VOTE_METHODS, samples per cell), whether the next
+# scans are sweeps (1) or steps (0), the ambiguity ratio of the calibration (in thousandths)
+# and the centroid of every color of COLORS (in 1/CENTROID_SCALE units), from CENTROID on
+METHOD = 0
+SWEEP = 1
+RATIO = 2
+CENTROID = 3
+CENTROID_SCALE = 4
+
+Sample = namedtuple('Sample', ['time', 'scan', 'line', 'position', 'rgb', 'bit'])
+Sample.__doc__ = """
+One raw color sensor sample of a session.
+    time: Seconds since the epoch when the sample was taken
+    scan: Number of the line scan, it grows with every scan including rescans of the same line
+    line: Number of the card line, it grows every time the card is scrolled
+    position: Sensor motor position, in degrees
+    rgb: Raw (red, green, blue) reading
+    bit: Bit the sample is classified as, None if ambiguous
+"""
+
+Setting = namedtuple('Setting', ['time', 'scan', 'line', 'kind', 'values'])
+Setting.__doc__ = """
+Setting in force from a point of a session on.
+    time: Seconds since the epoch when it was recorded
+    scan: Number of the line scan it was recorded in
+    line: Number of the card line it was recorded in
+    kind: METHOD, SWEEP, RATIO or CENTROID plus the code of a color
+    values: Three integers, see the kinds
+"""
+
+
+class Recorder:
+    """
+    Appends samples to a session log. Records are packed into a buffer and written
+    by a background thread, so recording never waits on the storage.
+    """
+
+    def __init__(self, path: str, buffer_records: int = 256) -> None:
+        """
+        Args:
+            path: Log file to create, every session gets its own log, as scans and lines are numbered from 0
+            buffer_records: Records packed before the buffer is handed to the writer
+        Raises:
+            FileExistsError: If the file exists
+        """
+        self.file = open(path, "xb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.file.flush()
+        self.scan = 0
+        self.line = 0
+        # Scan mode recorded last, None before the first scan
+        self.sweep = None
+        self.limit = buffer_records * RECORD.size
+        self.__buffer = bytearray()
+        self.__chunks = queue.Queue()
+        self.__writer = threading.Thread(target=self.__write, daemon=True)
+        self.__writer.start()
+
+    def record(self, position: int, rgb: Sequence[int], bit: Optional[int], timestamp: float = None) -> None:
+        """
+        Appends a sample of the current scan and line
+
+        Args:
+            position: Sensor motor position, in degrees
+            rgb: Raw reading of the color sensor, only the first three channels are kept
+            bit: Bit the sample is classified as, None if ambiguous
+            timestamp: time() when the sample was taken, now if not given
+        """
+        self.__buffer += RECORD.pack(time() if timestamp is None else timestamp, self.scan & 0xFFFF, self.line & 0xFFFF, position,
+                                     rgb[0], rgb[1], rgb[2], -1 if bit is None else bit)
+        if len(self.__buffer) >= self.limit:
+            self.__chunks.put(bytes(self.__buffer))
+            self.__buffer = bytearray()
+
+    def setting(self, kind: int, values: Sequence[int]) -> None:
+        """
+        Appends a setting record
+
+        Args:
+            kind: METHOD, SWEEP, RATIO or CENTROID plus the code of a color
+            values: Up to three integers
+        """
+        values = tuple(values) + (0,) * (3 - len(values))
+        self.record(kind, values, SETTING)
+
+    def record_method(self, method: str, samples: int) -> None:
+        """
+        Records how the readings of every bit cell are voted
+
+        Args:
+            method: Method of VOTE_METHODS
+            samples: Readings taken on every cell
+        """
+        self.setting(METHOD, (VOTE_METHODS.index(method), samples))
+
+    def record_calibration(self, centroids: Dict[str, Sequence[float]], ratio: float) -> None:
+        """
+        Records the calibration the next samples are classified with, see scan.centroid_classifier()
+
+        Args:
+            centroids: (red, green, blue) centroid of every color of COLORS
+            ratio: Ambiguity ratio
+        """
+        self.setting(RATIO, (round(ratio * 1000),))
+        for code, name in enumerate(COLORS):
+            self.setting(CENTROID + code, [round(value * CENTROID_SCALE) for value in centroids[name][:3]])
+
+    def next_scan(self, sweep: bool = False) -> None:
+        """
+        Marks the start of a new line scan
+
+        Args:
+            sweep: Whether the line is read with a sweep, recorded when it changes
+        """
+        self.scan += 1
+        if sweep != self.sweep:
+            self.sweep = sweep
+            self.setting(SWEEP, (int(sweep),))
+
+    def next_line(self) -> None:
+        """
+        Marks that the card moved to the next line
+        """
+        self.line += 1
+
+    def flush(self) -> None:
+        """
+        Blocks until every sample recorded so far is in the file
+        """
+        if self.__buffer:
+            self.__chunks.put(bytes(self.__buffer))
+            self.__buffer = bytearray()
+        self.__chunks.join()
+
+    def close(self) -> None:
+        """
+        Writes the pending samples and closes the log
+        """
+        self.flush()
+        self.__chunks.put(None)
+        self.__writer.join()
+        self.file.close()
+
+    def __write(self) -> None:
+        """
+        Body of the writer thread
+        """
+        while True:
+            chunk = self.__chunks.get()
+            if chunk is not None:
+                self.file.write(chunk)
+                self.file.flush()
+            self.__chunks.task_done()
+            if chunk is None:
+                return
+
+
+def unpack_sample(record: tuple) -> Union[Sample, Setting]:
+    """
+    Converts the fields of a RECORD into a Sample, or a Setting
+    """
+    stamp, scan, line, position, red, green, blue, bit = record
+    if bit == SETTING:
+        return Setting(stamp, scan, line, position, (red, green, blue))
+    return Sample(stamp, scan, line, position, (red, green, blue), None if bit < 0 else bit)
+
+
+def check_header(header: bytes, path: str) -> None:
+    """
+    Raises ValueError if the header does not belong to a session log of a known version
+    """
+    if len(header) < HEADER.size:
+        raise ValueError("Not a session log: " + path)
+    magic, version, size = HEADER.unpack(header[:HEADER.size])
+    if magic != MAGIC or version not in VERSIONS or size != RECORD.size:
+        raise ValueError("Not a session log: " + path)
+
+
+def read_session(path: str, chunk_records: int = 1024) -> Iterator[Union[Sample, Setting]]:
+    """
+    Streams the samples of a session log, reading it in chunks
+
+    Args:
+        path: Log file
+        chunk_records: Records read at once
+    Yields:
+        Sample: Every sample of the session, in order, and every Setting where it was recorded
+    Raises:
+        ValueError: If the file is not a session log
+    """
+    with open(path, "rb") as file:
+        check_header(file.read(HEADER.size), path)
+        while True:
+            chunk = file.read(chunk_records * RECORD.size)
+            # A partial record at the end is one still being written
+            chunk = chunk[:len(chunk) - len(chunk) % RECORD.size]
+            if not chunk:
+                return
+            for record in RECORD.iter_unpack(chunk):
+                yield unpack_sample(record)
+
+
+class Session:
+    """
+    Random access to the samples and settings of a session log through a memory map
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Args:
+            path: Log file
+        Raises:
+            ValueError: If the file is not a session log
+        """
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            check_header(self.map[:HEADER.size], path)
+        except ValueError:
+            self.map.close()
+            raise
+        self.length = (len(self.map) - HEADER.size) // RECORD.size
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> Union[Sample, Setting]:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("Sample index out of range")
+        return unpack_sample(RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size))
+
+    def close(self) -> None:
+        self.map.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Offline replay of recorded scan sessions (see recorder) through the same decoding,
+execution and announcement steps as main.read_card, without devices or sleeps.
+Sessions are replayed in parallel on a process pool.
+Run it with "python3 replay.py ../logs/*.bin" from the src/ folder.
+"""
+
+import argparse
+import io
+import itertools
+import multiprocessing
+from collections import namedtuple
+from contextlib import redirect_stdout
+from time import perf_counter
+from typing import List, Sequence
+import main
+from hamming_code import HCResult
+from pipeline import Pipeline
+from recorder import CENTROID, CENTROID_SCALE, METHOD, RATIO, SWEEP, Sample, read_session
+from scan import CELLS, COLORS, VOTE_METHODS, Classifier, Thresholds, centroid_classifier, segment_soft, vote
+from speech import Priority, Verbosity
+from stack_machine import SMState
+
+
+# Lines read by main.read_card on every card
+CARD_LINES = 10
+
+SessionResult = namedtuple('SessionResult', ['path', 'state', 'stack', 'cards', 'lines', 'rescans', 'spoken'])
+SessionResult.__doc__ = """
+Outcome of replaying a session.
+    path: Session log
+    state: Final SMState of the stack machine
+    stack: Final contents of the stack, bottom first
+    cards: Cards read
+    lines: Lines executed
+    rescans: Scans that were uncorrectable and read again
+    spoken: Messages that would have been spoken
+"""
+
+
+class Transcript:
+    """
+    Collects the messages main would speak at a verbosity, in place of the Announcer
+    """
+
+    def __init__(self, verbosity: Verbosity = Verbosity.FULL) -> None:
+        self.verbosity = verbosity
+        self.spoken = []
+
+    def speak(self, text: str, priority: Priority = Priority.NORMAL, key: str = None,
+              level: Verbosity = Verbosity.FULL) -> bool:
+        if level <= self.verbosity:
+            self.spoken.append(text)
+        return True
+
+    def flush(self, below: Priority = None) -> None:
+        """
+        Nothing is ever pending, every message is collected as it is spoken
+        """
+
+
+def session_scans(path: str) -> List[tuple]:
+    """
+    Reads the line scans of a session log as the robot read them, with the settings recorded
+    along the samples. Logs without settings are read as sweeps with the fixed thresholds.
+
+    Args:
+        path: Session log
+    Returns:
+        List: (card line, bits, confidences) of every scan, in order
+    """
+    method = "majority"
+    sweep = None
+    ratio = None
+    centroids = {}
+    classifier = Thresholds()
+    scans = []
+    for _, records in itertools.groupby(read_session(path), key=lambda record: record.scan):
+        samples = []
+        for record in records:
+            if isinstance(record, Sample):
+                samples.append(record)
+            elif record.kind == METHOD:
+                method = VOTE_METHODS[record.values[0]]
+            elif record.kind == SWEEP:
+                sweep = bool(record.values[0])
+            elif record.kind == RATIO:
+                ratio = record.values[0] / 1000
+            elif record.kind >= CENTROID:
+                code = record.kind - CENTROID
+                centroids[COLORS[code]] = tuple(value / CENTROID_SCALE for value in record.values)
+                # The centroids are recorded in the order of COLORS
+                if code == len(COLORS) - 1:
+                    classifier = centroid_classifier(centroids, ratio)
+        if not samples:
+            continue
+        if sweep is False:
+            bits, confidences = step_cells(samples, method, classifier)
+        else:
+            # Sweep positions are relative to the start of the line
+            bits, confidences = segment_soft(((sample.position, sample.rgb) for sample in samples),
+                                             classifier=classifier)
+        scans.append((samples[0].line, bits, confidences))
+    return scans
+
+
+def step_cells(samples: List[Sample], method: str, classifier: Classifier) -> tuple:
+    """
+    Votes the cells of a step scan as Robot.read_bit did. The readings of a cell are the
+    consecutive samples at one position, which is not the same on every line after a readjustment.
+
+    Args:
+        samples: Samples of the scan
+        method: Method of VOTE_METHODS the readings were voted with
+        classifier: Classifier of the median readings, the recorded bits are used otherwise
+    Returns:
+        tuple: Bits of the cells and their confidences, unreadable cells are added up to CELLS
+    """
+    cells = []
+    for _, readings in itertools.groupby(samples, key=lambda sample: sample.position):
+        readings = list(readings)
+        cells.append(vote([sample.rgb for sample in readings], method, [sample.bit for sample in readings], classifier))
+    cells = cells[:CELLS] + [(None, 0.0)] * (CELLS - len(cells))
+    return tuple(bit for bit, _ in cells), tuple(confidence for _, confidence in cells)
+
+
+def replay_session(path: str, verbosity: Verbosity = Verbosity.FULL) -> SessionResult:
+    """
+    Replays a session log as main.read_card would have processed it. A scan followed by
+    another scan of the same line was uncorrectable on the robot and read again.
+
+    Args:
+        path: Session log
+        verbosity: Profile the spoken messages are collected for
+    Returns:
+        SessionResult: Outcome of the session
+    """
+    pipeline = Pipeline()
+    spk = Transcript(verbosity)
+    scans = session_scans(path)
+    lines = 0
+    rescans = 0
+    state = SMState.RUNNING
+    # SPEAK prints its output, it is collected in the transcript instead
+    with redirect_stdout(io.StringIO()):
+        for index, (line, bits, confidences) in enumerate(scans):
+            rescan = index > 0 and scans[index - 1][0] == line
+            retried = index + 1 < len(scans) and scans[index + 1][0] == line
+            if (rescan or retried) and pipeline.decoder.decode_soft(bits, confidences)[1] == HCResult.UNCORRECTABLE:
+                # An uncorrectable rescan made the robot ask for the card to be adjusted
+                if rescan:
+                    main.announce_uncorrectable(spk, prompt=True)
+                if retried:
+                    main.announce_uncorrectable(spk)
+                    rescans += 1
+                    continue
+
+            event = main.execute_line(pipeline, spk, list(bits), confidences)
+            lines += 1
+            if event.state == SMState.STOPPED or event.state == SMState.ERROR:
+                main.announce_end(event, spk)
+                state = event.state
+                break
+            main.announce_line(event, spk)
+            if lines % CARD_LINES == 0:
+                main.announce_card(event, spk)
+
+    cards = (lines + CARD_LINES - 1) // CARD_LINES
+    return SessionResult(path, state, list(pipeline.sm.stack), cards, lines, rescans, spk.spoken)
+
+
+def replay_sessions(paths: Sequence[str], processes: int = None,
+                    verbosity: Verbosity = Verbosity.FULL) -> List[SessionResult]:
+    """
+    Replays many session logs in parallel
+
+    Args:
+        paths: Session logs
+        processes: Worker processes, one per CPU if not given
+        verbosity: Profile the spoken messages are collected for
+    Returns:
+        List: SessionResult of every session, in the order of the paths
+    """
+    with multiprocessing.Pool(processes) as pool:
+        return pool.starmap(replay_session, [(path, verbosity) for path in paths])
+
+
+def run(argv: list = None):
+    parser = argparse.ArgumentParser(description="Replays recorded scan sessions offline")
+    parser.add_argument("sessions", nargs="+", help="session logs recorded with main.py --record")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    results = replay_sessions(args.sessions, args.processes)
+    seconds = perf_counter() - start
+
+    for result in results:
+        print("{}: {} after {} lines, {} rescans, stack {}".format(
+            result.path, result.state.name, result.lines, result.rescans, result.stack))
+    cards = sum(result.cards for result in results)
+    print("{} sessions, {} cards in {:.3f} s: {:.0f} cards/s".format(len(results), cards, seconds, cards / seconds))
+
+
+if __name__ == '__main__':
+    run()
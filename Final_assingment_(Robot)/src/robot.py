@@ -1,76 +1,271 @@
 #!/usr/bin/env python3
 
-import ev3dev.ev3 as ev3
-from time import sleep
+from functools import wraps
+from time import time
+from devices import load
+from scan import classify, vote, CALIBRATION_LINE, SWEEP_END
+from timing import tracer
+
+
+def device_errors(devices) -> tuple:
+    """
+    Returns the exceptions a device backend raises when a device is missing or was reconnected
+    """
+    return OSError, getattr(devices, "DeviceNotFound", OSError)
+
+
+class MotorError(Exception):
+    """
+    Raised when a motor does not finish its move, so the robot is not where it was told to go
+    """
+
+
+def reopen_on_error(method):
+    """
+    Decorator for Robot methods: on a device error (e.g. a cable was reconnected) the cached
+    handles are dropped and the method is retried once with freshly opened devices.
+    Only for methods that can safely run twice, a move must not be commanded again.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except device_errors(self.devices):
+            self.release_devices()
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class Robot:
     """
-    This class provides logic for moving the sensor and scrolling the bar code cards
+    This class provides logic for moving the sensor and scrolling the bar code cards.
+    Motors and the color sensor are opened once, on first use, and the handles are reused.
     """
 
-    def sensor_step(self):
+    def __init__(self, timeout: float = 3, samples: int = 1, method: str = "majority", devices=None,
+                 recorder=None):
+        """
+        Args:
+            timeout: Maximum time, in seconds, to wait for a motor to finish a move
+            samples: Readings taken on every bit cell
+            method: How the readings of a cell are combined, "majority" or "median"
+            devices: Device backend, see devices.load(), the default backend if not given
+            recorder: recorder.Recorder logging every sample read, if given, the method is logged right away
+        """
+        self.devices = devices if devices is not None else load()
+        self.timeout = timeout
+        self.samples = samples
+        self.method = method
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.record_method(method, samples)
+        self.__rotator = None
+        self.__scroller = None
+        self.__sensor = None
+
+    @property
+    def rotator(self):
+        """
+        Medium motor moving the sensor across the card
+        """
+        if self.__rotator is None:
+            self.__rotator = self.devices.MediumMotor("outD")
+        return self.__rotator
+
+    @property
+    def scroller(self):
+        """
+        Large motor scrolling the card
+        """
+        if self.__scroller is None:
+            self.__scroller = self.devices.LargeMotor("outA")
+        return self.__scroller
+
+    @property
+    def sensor(self):
+        """
+        Color sensor, already switched to RGB-RAW mode
+        """
+        if self.__sensor is None:
+            sensor = self.devices.ColorSensor("in4")
+            sensor.mode = 'RGB-RAW'
+            self.__sensor = sensor
+        return self.__sensor
+
+    def release_devices(self):
+        """
+        Drops the cached device handles, they are opened again on next use
+        """
+        self.__rotator = None
+        self.__scroller = None
+        self.__sensor = None
+
+    @reopen_on_error
+    def start_move(self, motor: str, position: int, speed: int = 100, stop_action: str = "hold",
+                   relative: bool = True):
+        """
+        Opens a motor, sets up a move and commands it. This is the part of a move retried on a
+        device error: the command is sent last, so a relative move is never sent twice.
+
+        Args:
+            motor: "rotator" or "scroller"
+            position: Degrees to move, or position to move to if not relative
+            speed: Motor speed, in degrees per second
+            stop_action: What the motor does when it reaches the position
+            relative: Whether the position is relative to the current one
+        Returns:
+            Motor: The motor, running
+        """
+        device = getattr(self, motor)
+        device.stop_action = stop_action
+        device.speed_sp = speed
+        device.position_sp = position
+        if relative:
+            device.run_to_rel_pos()
+        else:
+            device.run_to_abs_pos()
+        return device
+
+    @reopen_on_error
+    def motor_position(self, motor: str) -> int:
+        """
+        Returns the position of a motor, "rotator" or "scroller", in degrees
+        """
+        return getattr(self, motor).position
+
+    def wait_for(self, *motors) -> None:
+        """
+        Waits until the given motors stop running, instead of sleeping a fixed time.
+        Nothing read after a move that did not finish can be trusted, so a move not finished
+        within the timeout, or whose motor fails while it runs, ends what the robot was doing.
+
+        Args:
+            motors: Motors that have just been commanded to move
+        Raises:
+            MotorError: If a move did not finish in time or its motor failed, the devices are then reopened on next use
+        """
+        for motor in motors:
+            try:
+                finished = motor.wait_while("running", timeout=int(self.timeout * 1000))
+            except device_errors(self.devices) as error:
+                self.release_devices()
+                raise MotorError("Motor failed while running: " + str(error)) from error
+            if not finished:
+                raise MotorError("Timeout: motor on " + motor.address + " still running after " + str(self.timeout) + " s")
+
+    @tracer.timed("robot.sensor_step")
+    def sensor_step(self) -> None:
         """
         Moves the sensor one step to read the next bar code value
         """
-        motor = ev3.MediumMotor("outD")
-        motor.stop_action = "hold"
-        motor.speed_sp = 100
-        motor.position_sp = 22
-        motor.run_to_rel_pos()
-        sleep(0.5)
+        self.wait_for(self.start_move("rotator", 22))
 
-    def sensor_reset(self):
+    @tracer.timed("robot.sensor_reset")
+    def sensor_reset(self) -> None:
         """
         Resets the sensor position
         """
-        motor = ev3.MediumMotor("outD")
-        motor.stop_action = "hold"
-        motor.speed_sp = 100
-        motor.position_sp = 0
-        motor.run_to_abs_pos()
-        sleep(1)
+        self.wait_for(self.start_move("rotator", 0, relative=False))
 
-    def scroll_step(self):
+    @tracer.timed("robot.scroll_step")
+    def scroll_step(self) -> None:
         """
         Moves the bar code card to the next line.
         """
-        motor = ev3.LargeMotor("outA")
-        motor.stop_action = "brake"
-        motor.speed_sp = 100
-        motor.position_sp = -90
-        motor.run_to_rel_pos()
-        sleep(2)
-
+        motor = self.start_move("scroller", -90, stop_action="brake")
+        if self.recorder is not None:
+            self.recorder.next_line()
+        self.wait_for(motor)
 
     def read_value(self) -> int:
         """
         Reads a single value, converts it and returns the binary expression
         :return: int
         """
-        sensor = ev3.ColorSensor("in4")
-        sensor.mode = 'RGB-RAW'
-        value = sensor.bin_data("hhhh")
-        if value[0] < 200 and value[1] < 250 and value[2] < 200:
-            return 1
-        elif value[1] > 200:
-            return 0
-        else:
-            return None
+        return self.read_bit()[0]
+
+    @reopen_on_error
+    def read_bit(self) -> tuple:
+        """
+        Takes the configured number of readings on the current cell and votes the bit
+
+        Returns:
+            tuple: Bit (None if undecided) and its confidence, between 0 and 1
+        """
+        sensor = self.sensor
+        readings = [sensor.bin_data("hhhh") for _ in range(self.samples)]
+        if self.recorder is not None:
+            position = self.rotator.position
+            for rgb in readings:
+                self.recorder.record(position, rgb, classify(rgb))
+        return vote(readings, self.method)
+
+    @reopen_on_error
+    def read_references(self, pattern: tuple = CALIBRATION_LINE, samples: int = 5) -> dict:
+        """
+        Reads a line of known colors, e.g. the one of the calibration card, as reference for scan.calibrate()
+
+        Args:
+            pattern: Bits printed on the line
+            samples: Readings taken on every cell
+        Returns:
+            dict: Readings of the "red" start of the line and of its "black" and "white" cells
+        """
+        references = {"black": [], "white": [], "red": []}
+        self.sensor_reset()
+        references["red"] += [self.sensor.bin_data("hhhh") for _ in range(samples)]
+        for bit in pattern:
+            self.sensor_step()
+            references["black" if bit else "white"] += [self.sensor.bin_data("hhhh") for _ in range(samples)]
+        self.sensor_reset()
+        return references
+
+    @tracer.timed("robot.sweep_line")
+    def sweep_line(self, speed: int = 400) -> list:
+        """
+        Moves the sensor across the whole line in a single move, sampling the color sensor
+        together with the motor position until the move ends. Use scan.segment to get the bits.
+        The move goes to an absolute position, so it is safe to command again, and a device
+        error while sampling ends the sweep early, leaving the cells not reached unreadable.
+
+        Args:
+            speed: Motor speed during the sweep, in degrees per second
+        Returns:
+            list: (position relative to the start of the line, RGB reading) samples
+        """
+        start = self.motor_position("rotator")
+        motor = self.start_move("rotator", start + SWEEP_END, speed, relative=False)
+        recorder = self.recorder
+        samples = []
+        # time() of every sample, they are recorded after the sweep to keep the loop tight
+        stamps = []
+        deadline = time() + self.timeout
+        try:
+            sensor = self.sensor
+            while "running" in motor.state:
+                samples.append((motor.position - start, sensor.bin_data("hhhh")))
+                now = time()
+                stamps.append(now)
+                if now > deadline:
+                    print("Timeout: sweep still running after " + str(self.timeout) + " s")
+                    break
+            samples.append((motor.position - start, sensor.bin_data("hhhh")))
+            stamps.append(time())
+        except device_errors(self.devices) as error:
+            print("Sweep failed: " + str(error))
+            self.release_devices()
+        if recorder is not None:
+            for (position, rgb), stamp in zip(samples, stamps):
+                recorder.record(position, rgb, classify(rgb), stamp)
+        return samples
 
-    def readjust_barcode(self):
+    @tracer.timed("robot.readjust_barcode")
+    def readjust_barcode(self) -> None:
         """
         Moves back the bar code in case it has advanced too much
         """
         print("Readjusting")
-        motor = ev3.LargeMotor("outA")
-        rotator = ev3.MediumMotor("outD")
-        motor.stop_action = "brake"
-        rotator.stop_action = "brake"
-        motor.speed_sp = 100
-        motor.position_sp = -10
-        rotator.speed_sp = 100
-        rotator.position_sp = 5
-        motor.run_to_rel_pos()
-        rotator.run_to_rel_pos()
-        sleep(1)
+        tracer.count("readjustments")
+        scroller = self.start_move("scroller", -10, stop_action="brake")
+        rotator = self.start_move("rotator", 5, stop_action="brake")
+        self.wait_for(scroller, rotator)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+"""
+Classification of color sensor readings into bits and segmentation of
+continuous sweeps into the bit cells of a bar code line.
+Kept free of ev3 code so recorded (position, RGB) traces can be decoded offline.
+
+Every reading is classified by the shared classifier. It starts with fixed
+thresholds, evaluated exactly, and calibrate() replaces it with a lookup table
+over the quantized RGB space fitted to reference readings of the card colors.
+"""
+
+from math import sqrt
+from statistics import median
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+
+CELLS = 11
+# Sensor motor degrees between two bit cells
+CELL_WIDTH = 22
+# Sensor motor position of the first cell center, relative to the start of the line
+FIRST_CELL = 22
+# Relative motor position the sweep moves to, just past the last cell
+SWEEP_END = FIRST_CELL + (CELLS - 1) * CELL_WIDTH + CELL_WIDTH // 2
+
+
+# Ways the readings of a bit cell can be combined, see vote()
+VOTE_METHODS = ("majority", "median")
+
+# Colors printed on the cards, the start of every line is red
+COLORS = ("black", "white", "red")
+# Bit of every color, and of ambiguous readings last
+BITS = (1, 0, None, None)
+# Code of red in COLORS
+RED = COLORS.index("red")
+# Largest raw value of a color channel, larger values are clamped
+MAX_RAW = 1023
+# Calibration card line, its cells are read as black and white references
+CALIBRATION_LINE = (1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1)
+
+
+def threshold_bit(rgb: Sequence[int]) -> Optional[int]:
+    """
+    Fixed thresholds the bits are read with before calibration
+
+    Args:
+        rgb: Raw (red, green, blue[, ...]) reading of the color sensor
+    Returns:
+        int: 1 for black, 0 for white, None if the reading is ambiguous
+    """
+    if rgb[0] < 200 and rgb[1] < 250 and rgb[2] < 200:
+        return 1
+    elif rgb[1] > 200:
+        return 0
+    else:
+        return None
+
+
+def threshold_red(rgb: Sequence[int]) -> bool:
+    """
+    Fixed threshold the red start of a line is found with before calibration
+
+    Args:
+        rgb: Raw (red, green, blue[, ...]) reading of the color sensor
+    Returns:
+        bool: Whether the red channel is above the green or the blue one
+    """
+    return rgb[0] > rgb[1] or rgb[0] > rgb[2]
+
+
+def threshold_color(rgb: Sequence[int]) -> Optional[str]:
+    """
+    Color of a reading with the fixed thresholds, the bit ones are checked first
+
+    Args:
+        rgb: Raw (red, green, blue[, ...]) reading of the color sensor
+    Returns:
+        str: Color of COLORS, None if the reading is ambiguous
+    """
+    bit = threshold_bit(rgb)
+    if bit is not None:
+        return COLORS[BITS.index(bit)]
+    return "red" if threshold_red(rgb) else None
+
+
+def centroid_color(centroids: Dict[str, Sequence[float]], ratio: float = 0.8) -> Callable:
+    """
+    Builds a nearest-centroid rule
+
+    Args:
+        centroids: Mean (red, green, blue) reading of every color of COLORS
+        ratio: Readings whose distance to the nearest centroid is more than this fraction
+               of the distance to the second nearest are ambiguous
+    Returns:
+        Callable: Rule converting a reading into a color of COLORS, None if ambiguous
+    """
+    points = [(name, tuple(centroids[name][:3])) for name in COLORS]
+
+    def rule(rgb: Sequence[int]) -> Optional[str]:
+        distances = sorted((sqrt(sum((value - center) ** 2 for value, center in zip(rgb, point))), name)
+                           for name, point in points)
+        (nearest, name), (second, _) = distances[:2]
+        return name if nearest <= ratio * second else None
+    return rule
+
+
+class Classifier:
+    """
+    Classifies raw readings with a lookup table holding the color of every quantized
+    RGB value, so a classification is a single index operation
+    """
+
+    def __init__(self, rule: Callable = threshold_color, bits: int = 5, centroids: dict = None,
+                 ratio: float = None) -> None:
+        """
+        Args:
+            rule: Converts a reading into a color of COLORS or None, evaluated once per table entry
+            bits: Bits kept of every channel, the table has 2 ** (3 * bits) entries
+            centroids: Centroids the rule was built from, if any
+            ratio: Ambiguity ratio the rule was built with, if any, see centroid_color()
+        """
+        self.rule = rule
+        self.bits = bits
+        self.shift = MAX_RAW.bit_length() - bits
+        self.centroids = centroids
+        self.ratio = ratio
+        half = 1 << self.shift >> 1
+        centers = [(level << self.shift) + half for level in range(1 << bits)]
+        codes = {name: code for code, name in enumerate(COLORS)}
+        self.table = bytes(codes.get(rule((red, green, blue)), len(COLORS))
+                           for red in centers for green in centers for blue in centers)
+        # Offset in the table of every raw value of each channel, cheaper than shifting on every reading
+        self.blue = [value >> self.shift for value in range(MAX_RAW + 1)]
+        self.green = [level << bits for level in self.blue]
+        self.red = [level << 2 * bits for level in self.blue]
+
+    def index(self, rgb: Sequence[int]) -> int:
+        """
+        Returns the table entry of a reading
+        """
+        try:
+            return self.red[rgb[0]] + self.green[rgb[1]] + self.blue[rgb[2]]
+        except IndexError:
+            return self.index([min(value, MAX_RAW) for value in rgb[:3]])
+
+    def color(self, rgb: Sequence[int]) -> Optional[str]:
+        """
+        Returns the color of COLORS of a reading, None if it is ambiguous
+        """
+        code = self.table[self.index(rgb)]
+        return COLORS[code] if code < len(COLORS) else None
+
+    def bit(self, rgb: Sequence[int]) -> Optional[int]:
+        """
+        Returns the bit of a reading, None if it is red or ambiguous
+        """
+        return BITS[self.table[self.index(rgb)]]
+
+    def is_red(self, rgb: Sequence[int]) -> bool:
+        """
+        Returns whether a reading is the red start of a line
+        """
+        return self.table[self.index(rgb)] == RED
+
+
+class Thresholds:
+    """
+    Classifier evaluating the fixed thresholds exactly on every reading, used until
+    calibration, as quantizing them into a table would move them
+    """
+
+    rule = staticmethod(threshold_color)
+    centroids = None
+    ratio = None
+
+    def color(self, rgb: Sequence[int]) -> Optional[str]:
+        """
+        Returns the color of COLORS of a reading, None if it is ambiguous
+        """
+        return threshold_color(rgb)
+
+    def bit(self, rgb: Sequence[int]) -> Optional[int]:
+        """
+        Returns the bit of a reading, None if it is red or ambiguous
+        """
+        return threshold_bit(rgb)
+
+    def is_red(self, rgb: Sequence[int]) -> bool:
+        """
+        Returns whether a reading is the red start of a line
+        """
+        return threshold_red(rgb)
+
+
+def fit(references: Dict[str, Iterable[Sequence[int]]], ratio: float = 0.8, bits: int = 5) -> Classifier:
+    """
+    Fits a nearest-centroid classifier to reference readings
+
+    Args:
+        references: Readings of cells known to be of every color of COLORS
+        ratio: See centroid_color()
+        bits: See Classifier
+    Returns:
+        Classifier: Classifier with the per-channel median of every color as centroid
+    Raises:
+        ValueError: If a color has no readings
+    """
+    centroids = {}
+    for name in COLORS:
+        readings = list(references.get(name, ()))
+        if not readings:
+            raise ValueError("No reference readings for " + name)
+        centroids[name] = tuple(median(channel) for channel in list(zip(*readings))[:3])
+    return centroid_classifier(centroids, ratio, bits)
+
+
+def centroid_classifier(centroids: Dict[str, Sequence[float]], ratio: float = 0.8, bits: int = 5) -> Classifier:
+    """
+    Builds the nearest-centroid classifier of known centroids, e.g. ones fitted on the robot
+
+    Args:
+        centroids: See centroid_color()
+        ratio: See centroid_color()
+        bits: See Classifier
+    Returns:
+        Classifier: Classifier of the centroids
+    """
+    return Classifier(centroid_color(centroids, ratio), bits, centroids, ratio)
+
+
+classifier = Thresholds()
+
+
+def calibrate(references: Dict[str, Iterable[Sequence[int]]], ratio: float = 0.8) -> Classifier:
+    """
+    Replaces the shared classifier with one fitted to reference readings, see fit()
+
+    Returns:
+        Classifier: The new classifier
+    """
+    global classifier
+    classifier = fit(references, ratio)
+    return classifier
+
+
+def color(rgb: Sequence[int]) -> Optional[str]:
+    """
+    Converts a raw RGB reading into a color with the shared classifier
+
+    Args:
+        rgb: Raw (red, green, blue[, ...]) reading of the color sensor
+    Returns:
+        str: "black", "white" or "red", None if the reading is ambiguous
+    """
+    return classifier.color(rgb)
+
+
+def is_red(rgb: Sequence[int]) -> bool:
+    """
+    Checks with the shared classifier whether a raw RGB reading is the red start of a line
+    """
+    return classifier.is_red(rgb)
+
+
+def classify(rgb: Sequence[int]) -> Optional[int]:
+    """
+    Converts a raw RGB reading into a bit with the shared classifier
+
+    Args:
+        rgb: Raw (red, green, blue[, ...]) reading of the color sensor
+    Returns:
+        int: 1 for black, 0 for white, None if the reading is red or ambiguous
+    """
+    return classifier.bit(rgb)
+
+
+def vote(readings: Sequence[Sequence[int]], method: str = "majority", bits: Sequence[Optional[int]] = None,
+         classifier: Classifier = None) -> Tuple[Optional[int], float]:
+    """
+    Classifies a bit cell from several readings
+
+    Args:
+        readings: Raw RGB readings taken on the same cell
+        method: "majority" to vote over the classified readings or
+                "median" to classify the per-channel median reading
+        bits: Bits the readings were classified as, e.g. recorded ones, classified here if not given
+        classifier: Classifier used instead of the shared one
+    Returns:
+        tuple: Bit (None if undecided) and confidence, the fraction of readings agreeing with it
+    """
+    bit_of = classify if classifier is None else classifier.bit
+    if bits is None:
+        bits = [bit_of(rgb) for rgb in readings]
+    if method == "median":
+        bit = bit_of([int(median(channel)) for channel in zip(*readings)])
+    elif method == "majority":
+        ones = bits.count(1)
+        zeros = bits.count(0)
+        bit = 1 if ones > zeros else 0 if zeros > ones else None
+    else:
+        raise ValueError("Unknown voting method: " + str(method))
+    if bit is None:
+        return None, 0.0
+    return bit, bits.count(bit) / len(bits)
+
+
+def segment(trace: Iterable[Tuple[int, Sequence[int]]], start: int = 0, margin: float = 0.25) -> Tuple[Optional[int], ...]:
+    """
+    Splits a sweep into the bit cells of the line and classifies each cell by majority
+    of the samples taken in its central part, away from the borders with the neighbours.
+
+    Args:
+        trace: (motor position, RGB reading) samples, in any order
+        start: Motor position at the start of the line
+        margin: Fraction of the cell width ignored at each border
+    Returns:
+        tuple: One bit per cell, None if the cell has no samples or they are tied
+    """
+    return segment_soft(trace, start, margin)[0]
+
+
+def segment_soft(trace: Iterable[Tuple[int, Sequence[int]]], start: int = 0, margin: float = 0.25,
+                 classifier: Classifier = None) -> Tuple[Tuple[Optional[int], ...], Tuple[float, ...]]:
+    """
+    Same as segment(), also giving the confidence of every cell as vote() does
+
+    Args:
+        classifier: Classifier used instead of the shared one, e.g. the one of a recorded session
+    Returns:
+        tuple: Bits of the cells and their confidence, the fraction of the samples of the cell agreeing with its bit
+    """
+    ones = [0] * CELLS
+    zeros = [0] * CELLS
+    totals = [0] * CELLS
+    low = margin * CELL_WIDTH
+    high = CELL_WIDTH - low
+    origin = start + FIRST_CELL - CELL_WIDTH / 2
+    bit_of = classify if classifier is None else classifier.bit
+    for position, rgb in trace:
+        cell, offset = divmod(position - origin, CELL_WIDTH)
+        if not 0 <= cell < CELLS or not low <= offset <= high:
+            continue
+        cell = int(cell)
+        totals[cell] += 1
+        bit = bit_of(rgb)
+        if bit == 1:
+            ones[cell] += 1
+        elif bit == 0:
+            zeros[cell] += 1
+    bits = tuple(1 if one > zero else 0 if zero > one else None for one, zero in zip(ones, zeros))
+    confidences = tuple(0.0 if bit is None else (one if bit else zero) / total
+                        for bit, one, zero, total in zip(bits, ones, zeros, totals))
+    return bits, confidences
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+"""
+Simulated ev3 devices with the subset of the ev3dev.ev3 interface used by the robot.
+Motors move at a configurable speed after a command latency and the color sensor
+reads a virtual bar code card at the position of the motors.
+The simulated clock advances with the motor waits and the sensor readings, and
+every simulated second takes 1/speedup seconds of wall time, so whole cards can be
+processed in moments on any computer and the simulated time does not depend on it.
+"""
+
+import random
+import threading
+from time import sleep as wall_sleep
+from typing import Iterable, Tuple
+from hamming_code import unpack
+from scan import CELLS, CELL_WIDTH, FIRST_CELL
+
+
+# Raw RGB readings of the colors printed on the cards
+BLACK = (60, 70, 50, 0)
+WHITE = (320, 380, 260, 0)
+RED = (400, 90, 80, 0)
+
+# Raw codewords of the lines of the example program of the assignment, it says "RES 64" and stops
+EXAMPLE_CARD = [0b00101010010, 0b01000101100, 0b01000101100, 0b01011010000, 0b01111100111,
+                0b00010011001, 0b01101111110, 0b00010011001, 0b01100110000, 0b00011010111,
+                0b01100011011, 0b10001011101, 0b11011000011, 0b10100001111, 0b11010100110,
+                0b00010110010, 0b10000111000, 0b01000000111]
+
+# Scroll motor degrees between two lines of a card
+LINE_STEP = -90
+
+SENSOR_MOTOR = "outD"
+SCROLL_MOTOR = "outA"
+
+
+class World:
+    """
+    State shared by the simulated devices: the card, the motor movements and the simulated clock
+    """
+
+    def __init__(self, card: Iterable = (), speedup: float = 1, max_speed: int = 1000, latency: float = 0.01,
+                 sample_time: float = 0.005, noise: float = 0, speech: float = 0, presses: Iterable[str] = (),
+                 seed: int = None) -> None:
+        """
+        Args:
+            card: Raw 11-bit words of the lines of the card, as tuples or packed into integers
+            speedup: How many times faster than the wall clock the simulated time runs, inf to never sleep
+            max_speed: Top speed of the motors, in degrees per second
+            latency: Seconds between a motor command and the start of the move
+            sample_time: Seconds taken by every color sensor reading
+            noise: Standard deviation of the noise added to every color channel
+            speech: Seconds of wall time taken to speak every character, speech does not advance the clock
+            presses: Names of the buttons that will be pressed, in order, one every time the buttons are read
+            seed: Seed of the noise
+        """
+        self.card = [unpack(word, CELLS) if isinstance(word, int) else tuple(word) for word in card]
+        self.speedup = speedup
+        self.max_speed = max_speed
+        self.latency = latency
+        self.sample_time = sample_time
+        self.noise = noise
+        self.speech = speech
+        self.presses = list(presses)
+        self.random = random.Random(seed)
+        self.spoken = []
+        # Motor address -> (start position, target position, start time, end time) of the last move
+        self.moves = {}
+        self.lock = threading.Lock()
+        self.clock = 0.0
+
+    def now(self) -> float:
+        """
+        Returns the simulated time, in seconds since the world was created
+        """
+        return self.clock
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Lets the given simulated time pass
+        """
+        if seconds > 0:
+            with self.lock:
+                self.clock += seconds
+            wall_sleep(seconds / self.speedup)
+
+    def position(self, address: str) -> float:
+        """
+        Returns the current position of a motor, in degrees
+        """
+        start, target, begin, end = self.moves.get(address, (0, 0, 0, 0))
+        now = self.now()
+        if now >= end:
+            return target
+        return start + (target - start) * (now - begin) / (end - begin)
+
+    def running(self, address: str) -> float:
+        """
+        Returns the simulated time left until a motor finishes its move, 0 if it is not moving
+        """
+        return max(0, self.moves.get(address, (0, 0, 0, 0))[3] - self.now())
+
+    def move(self, address: str, target: float, speed: int) -> None:
+        """
+        Starts moving a motor to the given position
+        """
+        self.sleep(self.latency)
+        start = self.position(address)
+        speed = min(abs(speed), self.max_speed)
+        duration = abs(target - start) / speed if speed else 0
+        now = self.now()
+        self.moves[address] = (start, target, now, now + duration)
+
+    def reading(self) -> Tuple[int, int, int, int]:
+        """
+        Returns the raw RGB reading of the card under the sensor. The start of every line is red.
+        """
+        line = int(round(self.position(SCROLL_MOTOR) / LINE_STEP))
+        cell = int((self.position(SENSOR_MOTOR) - FIRST_CELL + CELL_WIDTH / 2) // CELL_WIDTH)
+        if cell < 0:
+            rgb = RED
+        elif 0 <= line < len(self.card) and cell < CELLS and self.card[line][cell]:
+            rgb = BLACK
+        else:
+            rgb = WHITE
+        if self.noise:
+            rgb = tuple(max(0, int(value + self.random.gauss(0, self.noise))) for value in rgb[:3]) + (0,)
+        return rgb
+
+
+world = World()
+
+
+def reset(**kwargs) -> World:
+    """
+    Replaces the simulated world, see World for the arguments. Devices already opened use the new world.
+
+    Returns:
+        World: The new world
+    """
+    global world
+    world = World(**kwargs)
+    return world
+
+
+def load_card(path: str) -> list:
+    """
+    Reads a card from a text file with a line of 11 binary digits for every line of the card,
+    the first digit is read first. Blank lines and everything after a # are ignored.
+
+    Args:
+        path: File to read
+    Returns:
+        list: Tuples with the bits of the lines
+    Raises:
+        ValueError: If a line is not made of 11 binary digits
+    """
+    card = []
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            if len(line) != CELLS or set(line) - {"0", "1"}:
+                raise ValueError("{}:{}: expected {} binary digits: {}".format(path, number, CELLS, line))
+            card.append(tuple(int(digit) for digit in line))
+    return card
+
+
+class Motor:
+    """
+    Tacho motor moving at speed_sp to position_sp
+    """
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.stop_action = "coast"
+        self.speed_sp = 0
+        self.position_sp = 0
+
+    @property
+    def position(self) -> int:
+        return int(round(world.position(self.address)))
+
+    @property
+    def state(self) -> list:
+        return ["running"] if world.running(self.address) > 0 else []
+
+    def run_to_rel_pos(self) -> None:
+        world.move(self.address, world.position(self.address) + self.position_sp, self.speed_sp)
+
+    def run_to_abs_pos(self) -> None:
+        world.move(self.address, self.position_sp, self.speed_sp)
+
+    def wait_while(self, state: str, timeout: int = None) -> bool:
+        """
+        Waits until the motor leaves the given state, only "running" is supported
+
+        Args:
+            state: State to wait on
+            timeout: Maximum time to wait, in milliseconds
+        Returns:
+            bool: False if the timeout expired first
+        """
+        left = world.running(self.address)
+        if timeout is not None and left > timeout / 1000:
+            world.sleep(timeout / 1000)
+            return False
+        world.sleep(left)
+        return True
+
+
+class MediumMotor(Motor):
+    pass
+
+
+class LargeMotor(Motor):
+    pass
+
+
+class ColorSensor:
+    """
+    Color sensor reading the virtual card
+    """
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.mode = "COL-REFLECT"
+
+    def bin_data(self, fmt: str = None) -> Tuple[int, int, int, int]:
+        world.sleep(world.sample_time)
+        return world.reading()
+
+
+class Button:
+    """
+    Buttons pressing the names in World.presses, one every time they are processed.
+    ButtonEvents only processes them while someone waits for a press, so no press is lost.
+    """
+
+    on_change = None
+
+    def process(self) -> None:
+        with world.lock:
+            name = world.presses.pop(0) if world.presses else None
+        if name is not None and self.on_change is not None:
+            self.on_change([(name, True)])
+            self.on_change([(name, False)])
+
+
+class Sound:
+    """
+    Speaker recording what is said in World.spoken
+    """
+
+    def speak(self, text: str) -> None:
+        world.spoken.append(text)
+        wall_sleep(len(text) * world.speech)
+
+    def beep(self) -> None:
+        world.spoken.append("<beep>")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""
+Asynchronous announcements: messages are queued and spoken by a background
+worker so the robot keeps moving while the brick talks.
+A verbosity profile decides which messages are spoken, the rest can be logged.
+"""
+
+import heapq
+import threading
+from enum import IntEnum
+from typing import TextIO
+from timing import tracer
+
+
+class Priority(IntEnum):
+    """
+    Priorities of the announcements, lower values are spoken first
+    """
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class Verbosity(IntEnum):
+    """
+    Output profiles, every profile also speaks the messages of the ones below it
+    """
+    SILENT = 0
+    ERRORS = 1
+    SUMMARY = 2
+    FULL = 3
+
+
+class Announcer:
+    """
+    Speaks messages on a background thread from a bounded priority queue.
+    A message given a key replaces the pending message with the same key, so stale announcements are never spoken.
+    """
+
+    def __init__(self, sound, size: int = 8, verbosity: Verbosity = Verbosity.FULL, log: TextIO = None) -> None:
+        """
+        Args:
+            sound: Object with a speak(text) method, e.g. ev3.Sound(). If speak returns
+             a process, as ev3dev does, the worker waits for it before the next message
+            size: Maximum number of pending messages
+            verbosity: Most detailed level of the messages that are spoken
+            log: File the messages that are not spoken are written to, if given
+        """
+        self.sound = sound
+        self.size = size
+        self.verbosity = verbosity
+        self.log = log
+        # Heap of [priority, sequence, key, text] entries, text is set to None when an entry is dropped
+        self.__pending = []
+        self.__keys = {}
+        self.__count = 0
+        self.__sequence = 0
+        self.__busy = False
+        self.__closed = False
+        self.__condition = threading.Condition()
+        self.__worker = threading.Thread(target=self.__work, daemon=True)
+        self.__worker.start()
+
+    def speak(self, text: str, priority: Priority = Priority.NORMAL, key: str = None,
+              level: Verbosity = Verbosity.FULL) -> bool:
+        """
+        Queues a message and returns immediately, or logs it if its level is above the verbosity.
+        When the queue is full the least important, oldest pending message is dropped to make room.
+
+        Args:
+            text: Message to speak
+            priority: Priority of the message
+            key: Messages with the same key replace each other while pending
+            level: Least verbose profile the message is spoken in
+        Returns:
+            bool: False if the queue is full of more important messages and this one was dropped
+        """
+        if level > self.verbosity:
+            if self.log is not None:
+                self.log.write(level.name + ": " + text + "\n")
+            return True
+        with self.__condition:
+            if key is not None and key in self.__keys:
+                self.__drop(self.__keys[key])
+            if self.__count >= self.size:
+                victim = max((entry for entry in self.__pending if entry[3] is not None),
+                             key=lambda entry: (entry[0], -entry[1]))
+                if victim[0] < priority:
+                    return False
+                self.__drop(victim)
+            entry = [priority, self.__sequence, key, text]
+            self.__sequence += 1
+            heapq.heappush(self.__pending, entry)
+            if key is not None:
+                self.__keys[key] = entry
+            self.__count += 1
+            self.__condition.notify_all()
+        return True
+
+    def beep(self) -> None:
+        """
+        Beeps once every pending message has been spoken
+        """
+        self.wait()
+        with tracer.span("beep"):
+            self.sound.beep()
+
+    def flush(self, below: Priority = None) -> None:
+        """
+        Drops pending messages, the one being spoken is finished
+
+        Args:
+            below: Only the messages less important than this priority are dropped, every message if not given
+        """
+        with self.__condition:
+            if below is None:
+                self.__pending = []
+                self.__keys = {}
+                self.__count = 0
+            else:
+                for entry in self.__pending:
+                    if entry[3] is not None and entry[0] > below:
+                        self.__drop(entry)
+            self.__condition.notify_all()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blocks until every pending message has been spoken
+
+        Args:
+            timeout: Maximum time to wait, in seconds, forever if not given
+        Returns:
+            bool: False if the timeout expired first
+        """
+        with self.__condition:
+            return self.__condition.wait_for(lambda: self.__count == 0 and not self.__busy, timeout)
+
+    def close(self) -> None:
+        """
+        Speaks the pending messages and stops the worker
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__worker.join()
+
+    def __drop(self, entry: list) -> None:
+        """
+        Marks a pending entry as dropped, it is discarded when it reaches the top of the heap
+        """
+        entry[3] = None
+        if entry[2] is not None:
+            del self.__keys[entry[2]]
+        self.__count -= 1
+
+    def __work(self) -> None:
+        """
+        Body of the worker thread
+        """
+        while True:
+            with self.__condition:
+                while self.__count == 0 and not self.__closed:
+                    self.__condition.wait()
+                if self.__count == 0:
+                    return
+                entry = heapq.heappop(self.__pending)
+                while entry[3] is None:
+                    entry = heapq.heappop(self.__pending)
+                if entry[2] is not None:
+                    del self.__keys[entry[2]]
+                self.__count -= 1
+                self.__busy = True
+            try:
+                with tracer.span("speak", text=entry[3]):
+                    process = self.sound.speak(entry[3])
+                    if hasattr(process, "wait"):
+                        process.wait()
+            except Exception as error:
+                print("Speech failed: " + str(error))
+            finally:
+                with self.__condition:
+                    self.__busy = False
+                    self.__condition.notify_all()
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 from enum import IntEnum, Enum
+from functools import partial
+import math
 from typing import List, Tuple, Union
 from ctypes import c_ubyte
 
@@ -84,19 +86,162 @@ class Instruction(Enum):
     XOR = 0b011111
 
 
-def define(code_word: Tuple[int, ...]) -> Word:
+def pack(code_word: Tuple[int, ...]) -> int:
+    """
+    Auxiliary method used to pack a codeword tuple into an integer, the first bit being the most significant one
+    """
+    word = 0
+    for bit in code_word:
+        word = (word << 1) | bit
+    return word
+
+
+def define(code_word: Union[int, Tuple[int, ...]]) -> Word:
     """
     Auxiliary method used to check what a given codeword is
     """
-    code_word = list(code_word)
-    if code_word[0] == 0 and code_word[1] == 0:
+    if not isinstance(code_word, int):
+        code_word = pack(code_word)
+    if code_word < 0b010000:
         return Word.OPERAND
-    elif code_word[0] != 1:
+    elif code_word < 0b100000:
         return Word.INSTRUCTION
     else:
         return Word.CHARACTER
 
 
+# 8-tuples returned by top() for every possible value
+BYTE_TUPLES = tuple(tuple((value >> (7 - i)) & 1 for i in range(8)) for value in range(256))
+
+HEX_DIGITS = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'A', 'B', 'C', 'D', 'E', 'F']
+
+
+class Stack:
+    """
+    LIFO stack holding unsigned 8-bit integers and characters.
+    Values are kept in a bytearray with a parallel bytearray of tags. Characters are stored as the index of their
+    name in Stack.names, so pushing and popping does not create any object.
+    """
+
+    NUMBER = 0
+    CHARACTER = 1
+
+    # Names of the characters that can be stored, shared by every stack
+    names = [character.name for character in Character]
+    indexes = {name: index for index, name in enumerate(names)}
+
+    __slots__ = ('values', 'tags')
+
+    def __init__(self, values: bytes = b'', tags: bytes = b'') -> None:
+        self.values = bytearray(values)
+        self.tags = bytearray(tags)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> Union[int, str]:
+        if self.tags[index] == Stack.CHARACTER:
+            return Stack.names[self.values[index]]
+        return self.values[index]
+
+    def __iter__(self):
+        for index in range(len(self.values)):
+            yield self[index]
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return "Stack(" + repr(list(self)) + ")"
+
+    def append(self, item: Union[int, str, c_ubyte]) -> None:
+        """
+        Pushes a number (int or c_ubyte) or a character name to the stack
+        """
+        if isinstance(item, str):
+            if item not in Stack.indexes:
+                if len(Stack.names) == 256:
+                    raise ValueError("Too many different characters")
+                Stack.indexes[item] = len(Stack.names)
+                Stack.names.append(item)
+            self.values.append(Stack.indexes[item])
+            self.tags.append(Stack.CHARACTER)
+        else:
+            self.values.append(item.value if isinstance(item, c_ubyte) else item)
+            self.tags.append(Stack.NUMBER)
+
+    def pop(self) -> Union[int, str]:
+        """
+        Removes and returns the top element of the stack
+        """
+        item = self[-1]
+        self.values.pop()
+        self.tags.pop()
+        return item
+
+    def copy(self) -> 'Stack':
+        return Stack(self.values, self.tags)
+
+
+class Program:
+    """
+    Sequence of codewords compiled for StackMachine.run_program().
+    Every step is (handler, operation name, values to push, tags to push), consecutive operands and characters
+    being merged into a single step without handler.
+    """
+
+    __slots__ = ('steps', 'length')
+
+    # Characters executed instead of pushed
+    CONTROL = (Character.SPEAK.value, Character.NOP.value)
+
+    def __init__(self, words: List[Union[int, Tuple[int, ...]]]) -> None:
+        """
+        Compiles the given codewords.
+
+        Args:
+            words (list): 6-bit codewords, as tuples or packed into integers
+        Raises:
+            ValueError: If a word does not fit in 6 bits
+        """
+        self.steps = []
+        self.length = 0
+        values = bytearray()
+        tags = bytearray()
+        for word in words:
+            if not isinstance(word, int):
+                word = pack(word)
+            if not 0 <= word < 64:
+                raise ValueError("Invalid codeword: " + str(word))
+            self.length += 1
+            push = Program.PUSHES[word]
+            if push is not None:
+                values.append(push[0])
+                tags.append(push[1])
+                continue
+            if values:
+                self.steps.append((None, None, bytes(values), bytes(tags)))
+                values = bytearray()
+                tags = bytearray()
+            handler, op = StackMachine.dispatch[word]
+            self.steps.append((handler, op, None, None))
+        if values:
+            self.steps.append((None, None, bytes(values), bytes(tags)))
+
+    def __len__(self) -> int:
+        return self.length
+
+
+# Value and tag pushed by every codeword, None for the ones executed.
+# Stack.names starts with the characters in codeword order.
+Program.PUSHES = [(word, Stack.NUMBER) if word < 0b010000 else
+                  (word - 0b100000, Stack.CHARACTER) if word >= 0b100000 and word not in Program.CONTROL else None
+                  for word in range(64)]
+
+# Trace entry of a pushed word
+NO_STEP = (None, None)
+
+
 class StackMachine:
     """
     Implements the 8-bit stack machine according to the specification
@@ -107,33 +252,100 @@ class StackMachine:
         Initializes the class StackMachine with all values necessary.
         """
         self.overflow = False
-        self.stack = []
+        self.stack = Stack()
         self.op = None # Operation performed. Used to speak it out loud
         self.spk = None # String to speak with text-to-speech
 
-    def do(self, code_word: Tuple[int, ...]) -> SMState:
+    def do(self, code_word: Union[int, Tuple[int, ...]]) -> SMState:
         """
         Processes the entered code word by either executing the instruction or pushing the operand on the stack.
 
         Args:
-            code_word (tuple): Command for the stack machine to execute
+            code_word (tuple): Command for the stack machine to execute, as a 6-tuple or packed into an integer
         Returns:
             SMState: Current state of the stack machine
         """
-        self.op = None
         self.spk = None
-        code_word_type = define(code_word)
-        if code_word_type == Word.OPERAND:
-            num = "".join(str(c) for c in list(code_word)[2:])
-            a = int(num, 2)
-            self.stack.append(c_ubyte(a))
-            self.overflow = False
-            return SMState.RUNNING
-        code_word = "".join(str(c) for c in list(code_word))
-        if code_word_type == Word.CHARACTER:
-            self.character(code_word)
-        else:
-            return self.action(list(code_word))
+        if not isinstance(code_word, int):
+            code_word = pack(code_word)
+        handler, self.op = self.dispatch[code_word]
+        return handler(self)
+
+    def run_program(self, program: Union[Program, List[Union[int, Tuple[int, ...]]]]) -> Tuple[SMState, list]:
+        """
+        Executes a whole program, stopping as soon as the machine stops or gets an error.
+        A list of codewords is executed straight away, without compiling it first. A Program compiled
+        beforehand is checked once and pushes consecutive operands at once, for programs run many times.
+
+        Args:
+            program: Codewords to execute (tuples or packed integers), or a program compiled beforehand
+        Returns:
+            tuple: (final SMState, list of (op, spk) after every executed codeword)
+        Raises:
+            ValueError: If a codeword does not fit in 6 bits, the ones before it are executed
+        """
+        if not isinstance(program, Program):
+            return self.run_words(program)
+        values, tags = self.stack.values, self.stack.tags
+        running, stopped, error = SMState.RUNNING, SMState.STOPPED, SMState.ERROR
+        state = running
+        trace = []
+        record = trace.append
+        for handler, op, push_values, push_tags in program.steps:
+            if handler is None:
+                values.extend(push_values)
+                tags.extend(push_tags)
+                self.overflow = False
+                self.op = None
+                self.spk = None
+                state = running
+                trace.extend([NO_STEP] * len(push_values))
+                continue
+            self.op = op
+            self.spk = None
+            state = handler(self)
+            record((self.op, self.spk))
+            if state is stopped or state is error:
+                break
+        return (running if state is None else state), trace
+
+    def run_words(self, words: List[Union[int, Tuple[int, ...]]]) -> Tuple[SMState, list]:
+        """
+        Executes codewords one after the other through the dispatch table, with the pushes inlined,
+        see run_program()
+        """
+        values, tags = self.stack.values, self.stack.tags
+        dispatch = self.dispatch
+        pushes = Program.PUSHES
+        # Looked up once instead of on every word
+        running, stopped, error = SMState.RUNNING, SMState.STOPPED, SMState.ERROR
+        state = running
+        trace = []
+        record = trace.append
+        push = None
+        for word in words:
+            if not isinstance(word, int):
+                word = pack(word)
+            if word >> 6:
+                raise ValueError("Invalid codeword: " + str(word))
+            push = pushes[word]
+            if push is not None:
+                values.append(push[0])
+                tags.append(push[1])
+                self.overflow = False
+                state = running
+                record(NO_STEP)
+                continue
+            handler, self.op = dispatch[word]
+            self.spk = None
+            state = handler(self)
+            record((self.op, self.spk))
+            if state is stopped or state is error:
+                break
+        if push is not None:
+            self.op = None
+            self.spk = None
+        return (running if state is None else state), trace
 
     def top(self) -> Union[None, str, Tuple[int, int, int, int, int, int, int, int]]:
         """
@@ -142,217 +354,136 @@ class StackMachine:
         Returns:
             union: Can be tuple, str or None
         """
-        if not self.stack:
+        values = self.stack.values
+        if not values:
             return None
+        if self.stack.tags[-1] == Stack.CHARACTER:
+            return Stack.names[values[-1]]
+        return BYTE_TUPLES[values[-1]]
 
-        top = self.stack[len(self.stack) - 1]
-        if isinstance(top, c_ubyte):
-            aux = str(bin(top.value))[2:]
-            bin_rep = []
-            for i in range(8 - len(aux)):
-                bin_rep.append(0)
-            for i in aux:
-                bin_rep.append(int(i))
-            return tuple(bin_rep)
-        else:
-            return top
-
-    def character(self, code_word: str) -> SMState:
+    def character(self, code_word: int) -> SMState:
         """
         Operates accordingly if the code_word is a character
 
         Args:
-            code_word (str): Command for the stack machine to execute, parsed into a String
+            code_word (int): Command for the stack machine to execute, packed into an integer
         Returns:
             SMState: Current state of the stack machine
         """
-        aux = Character(int(code_word, 2))
+        aux = Character(code_word)
         if aux == Character.SPEAK:
             return self.speak()
         elif aux == (Character.NOP or Character.NOP1 or Character.NOP2 or Character.NOP3):
             return SMState.RUNNING
         else:
-            try:
-                self.stack.append(str(Character(int(code_word, 2)).name))
-                self.overflow = False
-            except ValueError:
-                return SMState.ERROR
+            self.push_character(Stack.indexes[aux.name])
 
-    def action(self, code_word: List) -> SMState:
+    def action(self, code_word: int) -> SMState:
         """
         Performs the instruction referred to by the code word
 
         Args:
-            code_word (List): Command for the stack machine to execute, parsed into a List
+            code_word (int): Command for the stack machine to execute, packed into an integer
         Returns:
             SMState: Current state of the stack machine
         """
-        num = int("".join(c for c in list(code_word)), 2)
-        action = Instruction(num)
-        if action == Instruction.STP:
-            self.op = "STP"
-            return SMState.STOPPED
-        elif action == Instruction.DUP:
-            self.op = "DUP"
-            return self.duplicate()
-        elif action == Instruction.DEL:
-            self.op = "DEL"
-            return self.delete()
-        elif action == Instruction.SWP:
-            self.op = "SWP"
-            return self.swap()
-        elif action == Instruction.ADD:
-            self.op = "ADD"
-            return self.add()
-        elif action == Instruction.SUB:
-            self.op = "SUB"
-            return self.subtract()
-        elif action == Instruction.MUL:
-            self.op = "MUL"
-            return self.multiply()
-        elif action == Instruction.DIV:
-            self.op = "DIV"
-            return self.divide()
-        elif action == Instruction.EXP:
-            self.op = "EXP"
-            return self.exponential()
-        elif action == Instruction.MOD:
-            self.op = "MOD"
-            return self.modulus()
-        elif action == Instruction.SHL:
-            self.op = "SHL"
-            return self.shift(True)
-        elif action == Instruction.SHR:
-            self.op = "SHR"
-            return self.shift(False)
-        elif action == Instruction.HEX:
-            self.op = "HEX"
-            return self.hexadecimal()
-        elif action == Instruction.FAC:
-            self.op = "FAC"
-            return self.factorial()
-        elif action == Instruction.NOT:
-            self.op = "NOT"
-            return self.negate()
-        elif action == Instruction.XOR:
-            self.op = "XOR"
-            return self.xor()
-
-    """ The following functions are each used to execute one instruction """
+        handler, self.op = self.dispatch[code_word]
+        return handler(self)
+
+    """ The following functions are each used to push a word to the stack """
+    def push_operand(self, value: int) -> SMState:
+        self.stack.values.append(value)
+        self.stack.tags.append(Stack.NUMBER)
+        self.overflow = False
+        return SMState.RUNNING
+
+    def push_character(self, index: int) -> None:
+        self.stack.values.append(index)
+        self.stack.tags.append(Stack.CHARACTER)
+        self.overflow = False
+
+    def nop(self) -> None:
+        pass
+
+    def speak_character(self) -> None:
+        """
+        Executes SPEAK when read as a character word, whose state is not reported by do()
+        """
+        self.speak()
+
+    """
+    The following functions are each used to execute one instruction.
+    Instructions working on numbers return SMState.ERROR when one of their operands is a character.
+    """
+    def stop(self) -> SMState:
+        return SMState.STOPPED
+
     def speak(self) -> SMState:
         self.op = "SPEAK"
-        if not self.stack:
+        values, tags = self.stack.values, self.stack.tags
+        if not values:
             return SMState.STOPPED
-        top = self.stack.pop().value
-        if len(self.stack) < top:
+        if tags[-1] == Stack.CHARACTER:
+            return SMState.ERROR
+        tags.pop()
+        top = values.pop()
+        if len(values) < top:
             return SMState.STOPPED
-        tts = ""
+        tts = []
         for _ in range(top):
-            aux = self.stack.pop()
-            if not isinstance(aux, str):
-                tts += str(aux.value)
-            elif aux == "SPACE":
-                tts += ' '
+            value = values.pop()
+            if tags.pop() == Stack.NUMBER:
+                tts.append(str(value))
+            elif Stack.names[value] == "SPACE":
+                tts.append(' ')
             else:
-                tts += aux
+                tts.append(Stack.names[value])
+        tts = "".join(tts)
         self.spk = tts
         print(tts)
         return SMState.RUNNING
 
     def duplicate(self) -> SMState:
-        if not self.stack:
+        values, tags = self.stack.values, self.stack.tags
+        if not values:
             return SMState.STOPPED
-        top = self.stack.pop()
-        self.stack.append(top)
-        self.stack.append(top)
+        values.append(values[-1])
+        tags.append(tags[-1])
         return SMState.RUNNING
 
     def delete(self) -> SMState:
-        if not self.stack:
+        values, tags = self.stack.values, self.stack.tags
+        if not values:
             return SMState.STOPPED
-        self.stack.pop()
+        values.pop()
+        tags.pop()
         return SMState.RUNNING
 
     def swap(self) -> SMState:
-        if len(self.stack) < 2:
+        values, tags = self.stack.values, self.stack.tags
+        if len(values) < 2:
             return SMState.STOPPED
-        first = self.stack.pop()
-        second = self.stack.pop()
-        self.stack.append(first)
-        self.stack.append(second)
+        values[-1], values[-2] = values[-2], values[-1]
+        tags[-1], tags[-2] = tags[-2], tags[-1]
         return SMState.RUNNING
 
     def add(self) -> SMState:
-        if len(self.stack) < 2:
-            return SMState.STOPPED
-        a = self.stack.pop().value
-        b = self.stack.pop().value
-        result = a + b
-        if result > 255:
-            self.overflow = True
-            self.stack.append(c_ubyte(255))
-        else:
-            self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.ADD.value)
 
     def subtract(self) -> SMState:
-        if len(self.stack) < 2:
-            return SMState.STOPPED
-        b = self.stack.pop().value
-        a = self.stack.pop().value
-        result = a - b
-        if 1 << (result.bit_length() - 1):
-            self.overflow = True
-            self.stack.append(c_ubyte(result))
-        else:
-            self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.SUB.value)
 
     def multiply(self) -> SMState:
-        if len(self.stack) < 2:
-            return SMState.STOPPED
-        b = self.stack.pop().value
-        a = self.stack.pop().value
-        result = c_ubyte(a).value * c_ubyte(b).value
-        if result > 255:
-            self.overflow = True
-            self.stack.append(c_ubyte(255))
-        else:
-            self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.MUL.value)
 
     def divide(self) -> SMState:
-        if len(self.stack) < 2:
-            return SMState.ERROR
-        b = self.stack.pop().value
-        a = self.stack.pop().value
-        if b <= 0:
-            return SMState.STOPPED
-        result = c_ubyte(a).value // c_ubyte(b).value
-        self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.DIV.value)
 
     def exponential(self) -> SMState:
-        if len(self.stack) < 2:
-            return SMState.STOPPED
-        b = self.stack.pop().value
-        a = self.stack.pop().value
-        result = a ** b
-        if result > 255:
-            self.overflow = True
-            self.stack.append(c_ubyte(result))
-        else:
-            self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.EXP.value)
 
     def modulus(self) -> SMState:
-        if len(self.stack) < 2:
-            return SMState.STOPPED
-        b = self.stack.pop().value
-        a = self.stack.pop().value
-        result = a % b
-        self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.MOD.value)
 
     def shift(self, direction: bool) -> SMState:
         """
@@ -364,85 +495,146 @@ class StackMachine:
         Returns:
              SMState: Current state of the stack machine
         """
-        if len(self.stack) < 2:
-            return SMState.STOPPED
-        b = self.stack.pop().value
-        a = self.stack.pop().value
-        if direction:
-            result = a << b
-            if result > 255:
-                self.overflow = True
-                self.stack.append(c_ubyte(result))
-                return SMState.RUNNING
-        else:
-            result = a >> b
-        self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.binary(Instruction.SHL.value if direction else Instruction.SHR.value)
 
     def hexadecimal(self) -> SMState:
-        if len(self.stack) < 2:
+        values, tags = self.stack.values, self.stack.tags
+        if len(values) < 2:
             return SMState.STOPPED
-        valid = ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', 'A', 'B', 'C', 'D', 'E', 'F']
-        a = self.stack.pop()
-        b = self.stack.pop()
-        if isinstance(a, c_ubyte):
-            a = str(a.value)
-        if isinstance(b, c_ubyte):
-            b = str(b.value)
-        if a not in valid or b not in valid:
+        a = Stack.names[values[-1]] if tags.pop() else str(values[-1])
+        b = Stack.names[values[-2]] if tags.pop() else str(values[-2])
+        del values[-2:]
+        if a not in HEX_DIGITS or b not in HEX_DIGITS:
             return SMState.ERROR
-        self.stack.append(c_ubyte(int(a + b, 16)))
+        values.append(int(a + b, 16))
+        tags.append(Stack.NUMBER)
         return SMState.RUNNING
 
     def factorial(self) -> SMState:
-        if not self.stack:
-            return SMState.STOPPED
-        a = self.stack.pop().value
-        result = 1
-        for i in range(1, a + 1):
-            result *= i
-        if result > 255:
-            self.overflow = True
-            self.stack.append(c_ubyte(255))
-        else:
-            self.stack.append(c_ubyte(result))
-        return SMState.RUNNING
+        return self.unary(Instruction.FAC.value)
 
-    def negate(self):
+    def negate(self) -> SMState:
+        return self.unary(Instruction.NOT.value)
+
+    def xor(self) -> SMState:
+        return self.binary(Instruction.XOR.value)
+
+    def binary(self, opcode: int) -> SMState:
         """
-        This comment serves as an explanation for how the result is obtained.
-        First - gets the top-most value from the stack as a 4 bit binary number, and represents it as a String
-        Second - creates a list of integers where each n position is the nth-bit of the String
-        Third - Negates each term of the list and creates a new list
-        Fourth - Transforms the integer list into a String by using map()
-        Fifth - Transforms the String into an integer
+        Executes an ALU instruction taking the two top-most values of the stack, using its precomputed tables
+
+        Args:
+            opcode (int): Instruction to execute
+        Returns:
+             SMState: Current state of the stack machine
         """
-        if not self.stack:
+        values, tags = self.stack.values, self.stack.tags
+        if len(values) < 2:
+            return SMState.ERROR if opcode == Instruction.DIV.value else SMState.STOPPED
+        if tags[-1] or tags[-2]:
+            return SMState.ERROR
+        results, status = alu_tables[opcode] or alu_table(opcode)
+        tags.pop()
+        index = values.pop() | (values.pop() << 8)
+        if status[index] == ALU_INVALID:
+            tags.pop()
             return SMState.STOPPED
-        result = int(''.join(map(str, [
-            1 if b == 0 else 0 for b in [int(b) for b in format(self.stack.pop().value, '08b')]
-        ])), 2)
-        self.stack.append(c_ubyte(result))
+        if status[index] == ALU_OVERFLOW:
+            self.overflow = True
+        values.append(results[index])
         return SMState.RUNNING
 
-    def xor(self) -> SMState:
+    def unary(self, opcode: int) -> SMState:
         """
-        This comment serves as an explanation for how the result is obtained
-        First - transforms the 2 top-most values from the stack into a 4 bit binary number,
-        and represents them as Strings
-        Second - transforms each String into a list of integers
-        Third - uses the zip() built-in to iterate through each value of each List simultaneously
-        Fourth - Creates a new List by performing the XOR oof each pair of bits
-        Fifth - Transforms the new integer List into a String using map()
-        Sixth - Transforms the String into an integer
+        Executes an ALU instruction taking the top-most value of the stack, using its precomputed tables
+
+        Args:
+            opcode (int): Instruction to execute
+        Returns:
+             SMState: Current state of the stack machine
         """
-        if not self.stack:
+        values = self.stack.values
+        if not values:
             return SMState.STOPPED
-        result = int(''.join(map(str, [
-            a ^ b for a, b in zip(
-                [int(b) for b in format(self.stack.pop().value, '08b')],
-                [int(b) for b in format(self.stack.pop().value, '08b')]
-            )
-        ])), 2)
-        self.stack.append(c_ubyte(result))
+        if self.stack.tags[-1]:
+            return SMState.ERROR
+        results, status = alu_tables[opcode] or alu_table(opcode)
+        value = values[-1]
+        if status[value] == ALU_OVERFLOW:
+            self.overflow = True
+        values[-1] = results[value]
         return SMState.RUNNING
+
+
+# Status of the result of an ALU instruction
+ALU_VALID = 0
+ALU_OVERFLOW = 1
+ALU_INVALID = 2
+
+# Functions computing (result, status) for every ALU instruction
+ALU_OPERATIONS = {
+    Instruction.ADD: lambda a, b: (255, ALU_OVERFLOW) if a + b > 255 else (a + b, ALU_VALID),
+    Instruction.SUB: lambda a, b: ((a - b) & 0xFF, ALU_OVERFLOW if a < b else ALU_VALID),
+    Instruction.MUL: lambda a, b: (255, ALU_OVERFLOW) if a * b > 255 else (a * b, ALU_VALID),
+    Instruction.DIV: lambda a, b: (a // b, ALU_VALID) if b else (0, ALU_INVALID),
+    Instruction.EXP: lambda a, b: (pow(a, b, 256), ALU_OVERFLOW if a > 1 and (b >= 8 or a ** b > 255) else ALU_VALID),
+    Instruction.MOD: lambda a, b: (a % b, ALU_VALID) if b else (0, ALU_INVALID),
+    Instruction.SHL: lambda a, b: ((a << min(b, 8)) & 0xFF, ALU_OVERFLOW if a and (b >= 8 or a << b > 255) else ALU_VALID),
+    Instruction.SHR: lambda a, b: (a >> b, ALU_VALID),
+    Instruction.XOR: lambda a, b: (a ^ b, ALU_VALID),
+    Instruction.NOT: lambda a: (a ^ 0xFF, ALU_VALID),
+    Instruction.FAC: lambda a: (255, ALU_OVERFLOW) if a > 5 else (math.factorial(a), ALU_VALID),
+}
+
+# Result and status tables of the ALU instructions indexed by opcode, built on first use and shared by every machine
+alu_tables = [None] * 0b100000
+
+
+def alu_table(opcode: int) -> Tuple[bytearray, bytearray]:
+    """
+    Auxiliary method used to build the result and status tables of an ALU instruction.
+    Binary instructions are indexed by (a << 8) | b, b being the top-most value of the stack.
+    """
+    operation = ALU_OPERATIONS[Instruction(opcode)]
+    if opcode in (Instruction.NOT.value, Instruction.FAC.value):
+        entries = [operation(a) for a in range(256)]
+    else:
+        entries = [operation(a, b) for a in range(256) for b in range(256)]
+    alu_tables[opcode] = (bytearray(r for r, _ in entries), bytearray(s for _, s in entries))
+    return alu_tables[opcode]
+
+
+def build_dispatch() -> list:
+    """
+    Auxiliary method used to build the table mapping every 6-bit codeword to its handler and the name of its
+    operation. Handlers are called with the stack machine as their only argument.
+    """
+    instructions = {
+        Instruction.STP: StackMachine.stop,
+        Instruction.DUP: StackMachine.duplicate,
+        Instruction.DEL: StackMachine.delete,
+        Instruction.SWP: StackMachine.swap,
+        Instruction.HEX: StackMachine.hexadecimal,
+    }
+    for instruction in (Instruction.ADD, Instruction.SUB, Instruction.MUL, Instruction.DIV, Instruction.EXP,
+                        Instruction.MOD, Instruction.SHL, Instruction.SHR, Instruction.XOR):
+        instructions[instruction] = partial(StackMachine.binary, opcode=instruction.value)
+    for instruction in (Instruction.NOT, Instruction.FAC):
+        instructions[instruction] = partial(StackMachine.unary, opcode=instruction.value)
+    table = [None] * 64
+    for value in range(16):
+        table[value] = (partial(StackMachine.push_operand, value=value), None)
+    for instruction, handler in instructions.items():
+        table[instruction.value] = (handler, instruction.name)
+    for character in Character:
+        if character == Character.SPEAK:
+            table[character.value] = (StackMachine.speak_character, None)
+        elif character == Character.NOP:
+            table[character.value] = (StackMachine.nop, None)
+        else:
+            table[character.value] = (partial(StackMachine.push_character, index=Stack.indexes[character.name]), None)
+    return table
+
+
+# Built once, so executing a codeword is a single lookup and a single call
+StackMachine.dispatch = build_dispatch()
@@ -1,9 +1,35 @@
 #!/usr/bin/env python3
 
 import io
+import json
+import os
+import tempfile
+import threading
+import types
 import unittest.mock
+from contextlib import redirect_stderr, redirect_stdout
 from hamming_code import *
 from stack_machine import *
+from pipeline import *
+from scan import *
+from speech import *
+from buttons import *
+from robot import MotorError, Robot
+from recorder import *
+from replay import *
+import main
+import simulator
+from simulator import EXAMPLE_CARD
+import benchmark
+import timing
+import scan
+
+
+def simulated_devices(**classes):
+    """ The simulator as a devices module, with some of its classes replaced """
+    devices = types.SimpleNamespace(**vars(simulator))
+    vars(devices).update(classes)
+    return devices
 
 
 class TestRobot(unittest.TestCase):
@@ -37,6 +63,736 @@ class TestRobot(unittest.TestCase):
         sm.do(hc.decode(tuple([0, 1, 0, 0, 0, 0, 0, 0, 1, 1, 1]))[0])
         assert mock_stdout.getvalue()[:-1] == "RES 64"
 
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_example_packed(self, mock_stdout):
+        """ Same workflow as test_example, using codewords packed into integers """
+        hc = HammingCode()
+        sm = StackMachine()
+        for code in EXAMPLE_CARD:
+            sm.do(hc.decode(code)[0])
+        assert mock_stdout.getvalue()[:-1] == "RES 64"
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_example_program(self, mock_stdout):
+        """ Same workflow as test_example, running the whole program at once """
+        hc = HammingCode()
+        sm = StackMachine()
+        program = Program([hc.decode(code)[0] for code in EXAMPLE_CARD])
+        state, trace = sm.run_program(program)
+        assert state == SMState.STOPPED
+        assert len(trace) == len(program) == 18
+        assert trace[1] == ("DUP", None) and trace[16] == ("SPEAK", "RES 64") and trace[17] == ("STP", None)
+        assert mock_stdout.getvalue()[:-1] == "RES 64"
+        # A list of words runs without being compiled, with the same outcome
+        words = [hc.decode(code)[0] for code in EXAMPLE_CARD]
+        listed = StackMachine()
+        assert listed.run_program(words) == (state, trace) and listed.stack == sm.stack
+        assert StackMachine().run_program(words[:3]) == (SMState.RUNNING, trace[:3])
+        with self.assertRaises(ValueError):
+            StackMachine().run_program([1, 64])
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_example_pipeline(self, mock_stdout):
+        """ Same workflow as test_example, streaming the raw scans through the pipeline """
+        # The line after STP is never read
+        codes = EXAMPLE_CARD + EXAMPLE_CARD[:1]
+        events = list(process(codes))
+        assert len(events) == 18
+        assert events[16].op == "SPEAK" and events[16].spk == "RES 64" and events[17].state == SMState.STOPPED
+        assert all(event.state == SMState.RUNNING for event in events[:17])
+        assert mock_stdout.getvalue()[:-1] == "RES 64"
+
+        pipeline = Pipeline()
+        event = pipeline.feed(0b00101010001)
+        assert event.result == HCResult.UNCORRECTABLE and event.data is None and event.state is None
+        assert len(pipeline.sm.stack) == 0
+        event = pipeline.feed((0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 1))
+        assert event.result == HCResult.CORRECTED and event.data == (0, 0, 1, 0, 1, 0)
+        assert event.state == SMState.RUNNING and event.top == (0, 0, 0, 0, 1, 0, 1, 0)
+
+
+class TestScan(unittest.TestCase):
+    def test_segment_sweep(self):
+        """ Bits of a line are recovered from a continuous sweep trace, ignoring the cell borders """
+        bits = (0, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0)
+        black, white, blurred = (60, 80, 40, 0), (320, 380, 240, 0), (230, 190, 150, 0)
+        trace = []
+        for position in range(0, SWEEP_END + 1, 3):
+            cell, offset = divmod(position - FIRST_CELL + CELL_WIDTH // 2, CELL_WIDTH)
+            if not 0 <= cell < CELLS or offset < 3 or offset > CELL_WIDTH - 3:
+                rgb = blurred
+            else:
+                rgb = black if bits[cell] else white
+            trace.append((position + 500, rgb))
+        assert classify(black) == 1 and classify(white) == 0 and classify(blurred) is None
+        assert segment(trace, start=500) == bits
+        assert segment(reversed(trace), start=500) == bits
+        assert segment(trace[:len(trace) // 2], start=500)[-1] is None
+
+    def test_calibration(self):
+        """ Colors are classified by the lookup table of the centroids fitted to the calibration card """
+        default = scan.classifier
+        # Until calibration, the bits and the red start are read exactly as with the original rules
+        values = sorted(set(range(0, 501, 20)) | {199, 200, 201, 249, 250, 251})
+        for rgb in ((red, green, blue) for red in values for green in values for blue in values):
+            old_bit = 1 if rgb[0] < 200 and rgb[1] < 250 and rgb[2] < 200 else 0 if rgb[1] > 200 else None
+            old_red = not (not rgb[0] > rgb[1] and not rgb[0] > rgb[2])
+            assert classify(rgb) == old_bit and is_red(rgb) == old_red, rgb
+        assert color((60, 80, 40, 0)) == "black" and color((400, 90, 80, 0)) == "red"
+        assert color((320, 380, 240, 0)) == "white" and classify((5000, 5000, 5000, 0)) == 0
+        # A dim sensor, the fixed thresholds take its white for black
+        dim = lambda rgb: tuple(value // 2 for value in rgb)
+        simulator.reset(card=[CALIBRATION_LINE], speedup=float("inf"), noise=10, seed=2)
+        robot = Robot(devices=simulator)
+        references = robot.read_references(samples=3)
+        assert [len(references[name]) for name in COLORS] == [18, 15, 3]
+        assert classify(dim(simulator.WHITE)) == 1
+        try:
+            references = {name: [dim(rgb) for rgb in readings] for name, readings in references.items()}
+            classifier = calibrate(references)
+            assert scan.classifier is classifier and robot.rotator.position == 0
+            for name, rgb in (("black", simulator.BLACK), ("white", simulator.WHITE), ("red", simulator.RED)):
+                assert all(abs(a - b) < 10 for a, b in zip(classifier.centroids[name], dim(rgb)))
+                assert color(dim(rgb)) == name == classifier.rule(dim(rgb))
+            assert classify(dim(simulator.WHITE)) == 0 and classify(dim(simulator.RED)) is None
+            # Halfway between black and white
+            assert color((95, 112, 77)) is None
+            with self.assertRaises(ValueError):
+                fit({"black": references["black"], "white": references["white"]})
+        finally:
+            scan.classifier = default
+
+    def test_vote(self):
+        """ Oversampled cells are classified by majority or median, with the share of agreeing readings """
+        black, white, blurred = (60, 80, 40, 0), (320, 380, 240, 0), (230, 190, 150, 0)
+        assert vote([black]) == (1, 1.0)
+        assert vote([black, blurred, white, black]) == (1, 0.5)
+        assert vote([black, white, blurred]) == (None, 0.0)
+        assert vote([white, blurred, blurred], "median") == (None, 0.0)
+        assert vote([black, (190, 240, 190, 0), white], "median") == (1, 2 / 3)
+        with self.assertRaises(ValueError):
+            vote([black], "mean")
+
+
+class TestSpeech(unittest.TestCase):
+    def test_announcer(self):
+        """ Messages are spoken in the background by priority, stale ones replaced and overflow dropped """
+        spoken = []
+        started = threading.Event()
+        gate = threading.Event()
+
+        class Sound:
+            def speak(self, text):
+                started.set()
+                gate.wait()
+                spoken.append(text)
+
+        spk = Announcer(Sound(), size=3)
+        spk.speak("first")
+        assert started.wait(1)
+        spk.speak("output", Priority.HIGH)
+        spk.speak("top 1", key="top")
+        spk.speak("top 2", key="top")
+        spk.speak("status", Priority.LOW)
+        assert spk.speak("late", Priority.LOW)
+        assert spk.speak("urgent", Priority.HIGH)
+        assert not spk.speak("chatter", Priority.LOW)
+        assert not spk.wait(0.01)
+        gate.set()
+        assert spk.wait(1)
+        assert spoken == ["first", "output", "urgent", "top 2"]
+        spk.flush()
+        spk.close()
+
+    def test_flush(self):
+        """ Flushing below a priority keeps the more important messages """
+        spoken = []
+        gate = threading.Event()
+
+        class Sound:
+            def speak(self, text):
+                gate.wait()
+                spoken.append(text)
+
+        spk = Announcer(Sound())
+        spk.speak("first")
+        spk.speak("RES 64", Priority.HIGH)
+        spk.speak("top 1", key="top")
+        spk.speak("status", Priority.LOW)
+        spk.speak("Card finished", Priority.HIGH)
+        spk.flush(Priority.HIGH)
+        spk.speak("top 2", key="top")
+        gate.set()
+        spk.close()
+        assert spoken[-3:] == ["RES 64", "Card finished", "top 2"]
+        assert "status" not in spoken and "top 1" not in spoken
+
+    def test_verbosity(self):
+        """ Messages above the verbosity profile are logged instead of spoken """
+        spoken = []
+
+        class Sound:
+            def speak(self, text):
+                spoken.append(text)
+
+        log = io.StringIO()
+        spk = Announcer(Sound(), verbosity=Verbosity.ERRORS, log=log)
+        spk.speak("Valid code")
+        spk.speak("RES 64", level=Verbosity.SUMMARY)
+        spk.speak("Uncorrectable code", level=Verbosity.ERRORS)
+        spk.close()
+        assert spoken == ["Uncorrectable code"]
+        assert log.getvalue() == "FULL: Valid code\nSUMMARY: RES 64\n"
+
+
+class TestDevices(unittest.TestCase):
+    def test_button_events(self):
+        """ Button presses reported by the input layer are queued in order """
+        changes = [[("enter", True)], [("enter", False), ("up", True)], [("backspace", True)]]
+
+        class Button:
+            on_change = None
+
+            def process(self):
+                if changes:
+                    self.on_change(changes.pop(0))
+
+        btn = ButtonEvents(Button(), interval=0.001)
+        assert btn.files == []
+        # Without event files, the button is only polled while a press is awaited
+        threading.Event().wait(0.02)
+        assert len(changes) == 3
+        assert btn.get(1) == "enter"
+        assert btn.wait_for("backspace", timeout=1) == "backspace"
+        assert btn.get(0.01) is None and btn.wait_for("enter", timeout=0.01) is None
+        btn.close()
+
+    def test_button_event_files(self):
+        """ The reader sleeps on the event files of a python-ev3dev 1.x button and only processes real input """
+        read_end, write_end = os.pipe()
+        processed = []
+
+        class Button:
+            on_change = None
+            _buttons = {"up": {"name": "gpio_keys-event"}, "enter": {"name": "gpio_keys-event"}}
+
+            @property
+            def evdev_device(self):
+                raise Exception("Event device not found")
+
+            def _button_file(self, name):
+                return io.FileIO(read_end, closefd=False)
+
+            def process(self):
+                processed.append(True)
+                self.on_change([("enter", True)])
+
+        btn = ButtonEvents(Button(), interval=0.001)
+        assert btn.files == [read_end]
+        assert btn.get(0.05) is None and not processed
+        os.write(write_end, b"\0" * 16)
+        assert btn.get(1) == "enter" and len(processed) == 1
+        btn.close()
+        os.close(read_end)
+        os.close(write_end)
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_simulated_card(self, mock_stdout):
+        """ Whole workflow of main on the simulated robot, from the motors to the final result """
+        world = simulator.reset(card=EXAMPLE_CARD, speedup=float("inf"), noise=20, seed=1)
+        robot = Robot(devices=simulator)
+        spk = Announcer(simulator.Sound(), verbosity=Verbosity.SUMMARY)
+        btn = ButtonEvents(simulator.Button())
+        pipeline = Pipeline()
+        main.read_card(robot, pipeline, spk, btn)
+        assert len(pipeline.sm.stack) == 2
+        with self.assertRaises(SystemExit) as stop:
+            main.read_card(robot, pipeline, spk, btn)
+        assert stop.exception.code == 0
+        assert world.spoken == ["Card finished, top value is: 6", "RES 64", "Stack machine stopped"]
+        assert mock_stdout.getvalue()[:-1] == "RES 64"
+
+        world = simulator.reset(card=EXAMPLE_CARD, speedup=float("inf"), noise=20, seed=1)
+        robot.sensor_reset()
+        assert segment(robot.sweep_line()) == world.card[0]
+        assert world.now() < 1
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_device_error(self, mock_stdout):
+        """ A device failing during a move is reopened, without commanding the move twice, and an unfinished move raises """
+        failures = []
+
+        class DeviceNotFound(Exception):
+            pass
+
+        class MediumMotor(simulator.MediumMotor):
+            def wait_while(self, state, timeout=None):
+                if failures:
+                    raise failures.pop()
+                return super().wait_while(state, timeout)
+
+            def run_to_rel_pos(self):
+                if failures and isinstance(failures[-1], DeviceNotFound):
+                    raise failures.pop()
+                super().run_to_rel_pos()
+
+        devices = simulated_devices(MediumMotor=MediumMotor, DeviceNotFound=DeviceNotFound)
+        simulator.reset(card=EXAMPLE_CARD, speedup=float("inf"))
+        robot = Robot(devices=devices)
+        failures.append(OSError("motor unplugged"))
+        with self.assertRaisesRegex(MotorError, "Motor failed while running: motor unplugged"):
+            robot.sensor_step()
+        # The wait failed, the move goes on
+        simulator.world.sleep(1)
+        assert robot.rotator.position == 22
+        failures.append(DeviceNotFound("motor unplugged"))
+        robot.sensor_step()
+        assert robot.rotator.position == 44
+        # A step takes 0.22 s
+        with self.assertRaisesRegex(MotorError, "Timeout: motor on outD still running after 0.1 s"):
+            Robot(timeout=0.1, devices=devices).sensor_step()
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_scanner_errors(self, mock_stdout):
+        """ An error on the scanner thread ends the card on the main thread, and a stop ends a rescan """
+        class ColorSensor(simulator.ColorSensor):
+            reads = 0
+
+            def bin_data(self, fmt=None):
+                ColorSensor.reads += 1
+                # The red check and the 11 cells of two lines
+                if ColorSensor.reads > 24:
+                    raise ValueError("sensor broken")
+                return super().bin_data(fmt)
+
+        devices = simulated_devices(ColorSensor=ColorSensor)
+        world = simulator.reset(card=EXAMPLE_CARD, speedup=float("inf"))
+        robot = Robot(devices=devices)
+        spk = Announcer(simulator.Sound(), verbosity=Verbosity.SUMMARY)
+        btn = ButtonEvents(simulator.Button())
+        pipeline = Pipeline()
+        with self.assertRaises(ValueError):
+            main.read_card(robot, pipeline, spk, btn)
+        spk.wait()
+        assert len(pipeline.sm.stack) == 2 and world.spoken == []
+
+        # Two errors in every line, nobody presses enter
+        world = simulator.reset(card=[code ^ 0b11 for code in EXAMPLE_CARD], speedup=float("inf"))
+        robot = Robot(devices=simulator)
+        stop = threading.Event()
+        threading.Timer(0.1, stop.set).start()
+        word, confidences = main.read_line(robot)
+        assert main.uncorrectable(Pipeline(), spk, word, robot, btn, confidences, stop) is None
+
+    def test_confidences(self):
+        """ The confidence of every bit read reaches the decoder, which tries the least confident bits first """
+        world = simulator.reset(card=EXAMPLE_CARD, speedup=float("inf"), noise=60, seed=3)
+        robot = Robot(devices=simulator, samples=5)
+        word, confidences = main.read_line(robot)
+        assert tuple(word) == world.card[0] and len(confidences) == CELLS
+        assert all(0.5 < confidence <= 1 for confidence in confidences) and min(confidences) < 1
+        robot.sensor_reset()
+        word, confidences = main.read_line(robot, sweep=True)
+        assert tuple(word) == world.card[0] and all(0.5 < confidence <= 1 for confidence in confidences)
+
+        double = [1, 1, 1, 1, 1, 1, 0, 0, 1, 0, 1]
+        confidences = (0.6, 1, 1, 1, 1, 1, 1, 1, 1, 0.8, 1)
+        spk = Transcript()
+        assert main.execute_line(Pipeline(), spk, double).result == HCResult.UNCORRECTABLE
+        event = main.execute_line(Pipeline(), spk, double, confidences)
+        assert event.result == HCResult.CORRECTED and event.fixed == (0, 9)
+        assert "Uncertain bits: bit 0 is 1 at 60%, bit 9 is 0 at 80%" in spk.spoken
+
+    def test_parse_args(self):
+        """ Command line options of main, oversampling and sweeping included """
+        args = main.parse_args(["--samples", "3", "--vote", "median", "--verbosity", "errors"])
+        assert args.samples == 3 and args.vote == "median" and args.verbosity == "errors"
+        args = main.parse_args([])
+        assert args.samples == 1 and args.vote == "majority" and not args.sweep
+        assert main.parse_args(["--sweep"]).sweep
+        with redirect_stderr(io.StringIO()):
+            for argv in (["--samples", "0"], ["--vote", "mean"], ["--backend", "ev3", "--speedup", "10"],
+                         ["--backend", "sim", "--speedup", "0"]):
+                with self.assertRaises(SystemExit):
+                    main.parse_args(argv)
+        args = main.parse_args(["--backend", "sim", "--speedup", "inf", "--presses", "up,enter"])
+        assert args.speedup == float("inf") and args.presses == ["up", "enter"] and args.card is None
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_simulated_run(self, mock_stdout):
+        """ main runs a card file on the simulator, pressing enter for the second card, until the program stops """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "card.txt")
+            with open(path, "w") as file:
+                file.write("# RES 64, STOP\n\n")
+                file.writelines("{:011b}\n".format(code) for code in EXAMPLE_CARD)
+            assert simulator.load_card(path) == [unpack(code, 11) for code in EXAMPLE_CARD]
+            log = os.path.join(folder, "log.txt")
+            with self.assertRaises(SystemExit) as stop:
+                main.run(["--backend", "sim", "--card", path, "--speedup", "inf", "--presses", "enter",
+                          "--verbosity", "summary", "--log", log])
+            # The log is closed, so everything is in the file
+            with open(log) as file:
+                assert file.read().endswith("FULL: Decoded word is: (0, 1, 0, 0, 0, 0)\n")
+        assert stop.exception.code == 0
+        assert simulator.world.spoken[-1] == "Stack machine stopped" and simulator.world.presses == []
+
+    @unittest.mock.patch('main.sleep')
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_simulated_presses(self, mock_stdout, mock_sleep):
+        """ A simulated press is kept until the program waits for it, after an uncorrectable line """
+        class ColorSensor(simulator.ColorSensor):
+            reads = 0
+
+            def bin_data(self, fmt=None):
+                # The first two readings of the line flip two bits, until the card is adjusted
+                ColorSensor.reads += 1
+                rgb = super().bin_data(fmt)
+                if ColorSensor.reads in (1, 2, 12, 13):
+                    rgb = simulator.WHITE if rgb == simulator.BLACK else simulator.BLACK
+                return rgb
+
+        devices = simulated_devices(ColorSensor=ColorSensor)
+        world = simulator.reset(card=EXAMPLE_CARD[:1], speedup=float("inf"), presses=["enter"])
+        btn = ButtonEvents(simulator.Button())
+        spk = Announcer(simulator.Sound(), verbosity=Verbosity.SUMMARY)
+        robot = Robot(devices=devices)
+        sleep(0.2)
+        assert world.presses == ["enter"]
+        word, confidences = main.read_line(robot)
+        line = main.uncorrectable(Pipeline(), spk, word, robot, btn, confidences)
+        btn.close()
+        assert line[0] == list(unpack(EXAMPLE_CARD[0], 11)) and world.presses == []
+        spk.wait()
+        assert "<beep>" in world.spoken
+
+
+class TestRecorder(unittest.TestCase):
+    def test_recorder(self):
+        """ Every sample of a simulated card is logged and read back, streamed and memory-mapped """
+        codes = EXAMPLE_CARD[:3]
+        simulator.reset(card=codes, speedup=float("inf"))
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "session.bin")
+            recorder = Recorder(path, buffer_records=4)
+            robot = Robot(devices=simulator, samples=3, recorder=recorder)
+            words = []
+            for _ in codes:
+                words.append(main.read_line(robot)[0])
+                main.next(robot)
+            robot.sensor_reset()
+            # The sweep takes 0.6 simulated seconds, 0.06 s of wall time
+            simulator.world.speedup = 10
+            main.read_line(robot, sweep=True)
+            recorder.close()
+
+            records = list(read_session(path, chunk_records=5))
+            samples = [record for record in records if isinstance(record, Sample)]
+            settings = [(record.scan, record.kind, record.values) for record in records if isinstance(record, Setting)]
+            assert settings == [(0, METHOD, (0, 3, 0)), (1, SWEEP, (0, 0, 0)), (4, SWEEP, (1, 0, 0))]
+            steps = [sample for sample in samples if sample.scan <= len(codes)]
+            assert len(steps) == len(codes) * 11 * 3
+            assert [tuple(sample.bit for sample in steps[i * 33:(i + 1) * 33:3]) for i in range(3)] == [tuple(word) for word in words]
+            assert [sample.line for sample in steps[::33]] == [0, 1, 2] and steps[-1].position == 242
+            sweep = [sample for sample in samples if sample.scan == len(codes) + 1]
+            assert sweep and all(sample.line == len(codes) for sample in sweep)
+            # Every sample of the sweep is stamped when it was taken
+            stamps = [sample.time for sample in sweep]
+            assert stamps == sorted(stamps) and stamps[-1] - stamps[0] > 0.03 and stamps[0] > steps[-1].time
+
+            session = Session(path)
+            assert len(session) == len(records) and session[-1] == records[-1] and session[40] == records[40]
+            session.close()
+            # A session never continues the numbering of another one in the same log
+            with self.assertRaises(FileExistsError):
+                Recorder(path)
+            with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                main.parse_args(["--record", path])
+            assert len(list(read_session(path))) == len(records)
+            with open(path, "ab") as file:
+                file.write(b"\0" * (RECORD.size - 1))
+            assert len(list(read_session(path))) == len(records)
+            junk = os.path.join(folder, "junk.bin")
+            with open(junk, "wb") as file:
+                file.write(b"not a session log")
+            with self.assertRaises(ValueError):
+                list(read_session(junk))
+
+    def test_replay(self):
+        """ Recorded sessions are replayed through the steps of main, rescans included """
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for errors in (0, 0b11):
+                path = os.path.join(folder, "session{}.bin".format(errors))
+                recorder = Recorder(path)
+                for line, code in enumerate(EXAMPLE_CARD):
+                    # The third line is read twice with two errors first, when errors are given
+                    scans = [code ^ errors, code ^ errors, code] if line == 2 and errors else [code]
+                    for word in scans:
+                        recorder.next_scan()
+                        for cell, bit in enumerate(unpack(word, CELLS)):
+                            recorder.record(FIRST_CELL + cell * CELL_WIDTH, simulator.BLACK if bit else simulator.WHITE, bit)
+                    recorder.next_line()
+                recorder.close()
+                paths.append(path)
+
+            results = replay_sessions(paths, processes=2, verbosity=Verbosity.SUMMARY)
+            # The robot asked for the card to be adjusted after the rescan
+            assert replay_session(paths[1], Verbosity.ERRORS).spoken == [
+                "Uncorrectable code", "Uncorrectable code, adjust card and press enter", "Uncorrectable code"]
+        assert [result.rescans for result in results] == [0, 2]
+        for path, result in zip(paths, results):
+            assert result.path == path and result.state == SMState.STOPPED and result.stack == []
+            assert result.cards == 2 and result.lines == 18
+            assert result.spoken[-3:] == ["Card finished, top value is: 6", "RES 64", "Stack machine stopped"]
+        assert results[1].spoken[0] == "Uncorrectable code"
+
+
+    @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_replay_settings(self, mock_stdout):
+        """ Replays read the scans with the method, scan mode and calibration of the session """
+        class ColorSensor(simulator.ColorSensor):
+            def bin_data(self, fmt=None):
+                # A dim sensor, only readable once calibrated
+                return tuple(value // 2 for value in super().bin_data(fmt))
+
+        devices = simulated_devices(ColorSensor=ColorSensor)
+        world = simulator.reset(card=[CALIBRATION_LINE] + EXAMPLE_CARD[:3], speedup=float("inf"), noise=20,
+                                seed=1, presses=["enter", "enter"])
+        default = scan.classifier
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "session.bin")
+            recorder = Recorder(path)
+            robot = Robot(devices=devices, samples=3, method="median", recorder=recorder)
+            btn = ButtonEvents(simulator.Button())
+            lines = []
+            try:
+                main.calibrate(robot, Announcer(simulator.Sound(), verbosity=Verbosity.SILENT), btn)
+                main.next(robot)
+                # The cells of the next step scan are 5 degrees further
+                robot.readjust_barcode()
+                lines.append(main.read_line(robot))
+                main.next(robot)
+                lines.append(main.read_line(robot, sweep=True))
+                main.next(robot)
+                lines.append(main.read_line(robot))
+            finally:
+                scan.classifier = default
+                btn.close()
+                recorder.close()
+            assert [tuple(word) for word, _ in lines] == world.card[1:]
+            assert session_scans(path) == [(line, tuple(word), tuple(confidences))
+                                           for line, (word, confidences) in enumerate(lines, 1)]
+        # Step cells are the readings at one position, majority votes the recorded bits
+        samples = [Sample(0, 1, 0, FIRST_CELL + 10 + cell * CELL_WIDTH, simulator.WHITE, 1) for cell in range(CELLS - 1)]
+        assert step_cells(samples, "majority", Thresholds()) == ((1,) * 10 + (None,), (1.0,) * 10 + (0.0,))
+        assert step_cells(samples, "median", Thresholds()) == ((0,) * 10 + (None,), (0.0,) * 10 + (0.0,))
+
+
+class TestTiming(unittest.TestCase):
+    def test_tracer(self):
+        """ Spans and counters of a simulated card are summarized and exported as a Chrome trace """
+        simulator.reset(card=EXAMPLE_CARD[:10], speedup=float("inf"))
+        robot = Robot(devices=simulator)
+        spk = Announcer(simulator.Sound(), verbosity=Verbosity.SILENT)
+        btn = ButtonEvents(simulator.Button())
+        tracer = timing.tracer
+        assert tracer.span("disabled") is timing.NULL_SPAN
+        tracer.count("disabled")
+        tracer.enabled = True
+        try:
+            tracer.card_summary()
+            main.read_card(robot, Pipeline(), spk, btn)
+            robot.readjust_barcode()
+            summary = tracer.card_summary()
+        finally:
+            tracer.enabled = False
+        spans = summary["spans"]
+        assert spans["read_line"][0] == 10 and spans["decode_line"][0] == 10 and spans["operate"][0] == 10
+        assert spans["robot.sensor_step"][0] == 110 and spans["robot.scroll_step"][0] == 10
+        assert "uncorrectable" not in spans and summary["counters"] == {"readjustments": 1}
+        assert tracer.card_summary() == {"spans": {}, "counters": {}}
+        assert "read_line" in timing.format_summary(summary)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "trace.json")
+            tracer.export(path)
+            with open(path) as file:
+                events = json.load(file)["traceEvents"]
+        names = [event["name"] for event in events if event["ph"] == "X"]
+        assert names.count("read_line") == 10 and "disabled" not in names
+        assert all(event["dur"] >= 0 for event in events if event["ph"] == "X")
+        assert [event["args"] for event in events if event["ph"] == "C"] == [{"readjustments": 1}]
+
+    def test_benchmark_compare(self):
+        """ Rates that drop more than the threshold against the baseline are regressions, on seeded corpora """
+        baseline = {"decode": 1000, "encode": 1000, "cards": 60}
+        results = {"decode": 850, "encode": 700, "cards": 90, "new": 1}
+        with redirect_stdout(io.StringIO()) as output:
+            assert benchmark.compare(results, baseline, 0.2) == ["encode"]
+            assert benchmark.compare(results, baseline, 0.1) == ["decode", "encode"]
+        assert "new" not in output.getvalue() and "REGRESSION" in output.getvalue()
+        # The cards benchmark leaves no speech or button thread behind
+        threads = threading.active_count()
+        with redirect_stdout(io.StringIO()):
+            assert set(benchmark.bench_cards(1)) == {"read_card (step)", "read_card (sweep)"}
+        assert threading.active_count() == threads
+        # Every run measures the same corpus
+        codes = benchmark.random_codes(HammingCode(), 50, 2)
+        assert codes == benchmark.random_codes(HammingCode(), 50, 2) != benchmark.random_codes(HammingCode(), 50, 2, seed=1)
+
+
+class TestHammingCode(unittest.TestCase):
+    def test_decode_all_errors(self):
+        """ Every single-bit error is corrected and every double-bit error is detected """
+        hc = HammingCode()
+        for value in range(64):
+            word = tuple((value >> (5 - i)) & 1 for i in range(6))
+            code = list(hc.encode(word))
+            assert hc.decode(tuple(code)) == (word, HCResult.VALID)
+            for i in range(11):
+                code[i] ^= 1
+                assert hc.decode(tuple(code)) == (word, HCResult.CORRECTED)
+                for j in range(i + 1, 11):
+                    code[j] ^= 1
+                    assert hc.decode(tuple(code)) == (None, HCResult.UNCORRECTABLE)
+                    code[j] ^= 1
+                code[i] ^= 1
+
+    def test_packed_words(self):
+        """ Packed integers are encoded and decoded like their tuple counterparts """
+        hc = HammingCode()
+        for value in range(64):
+            code = hc.encode(value)
+            assert unpack(code, 11) == hc.encode(unpack(value, 6))
+            assert hc.decode(code) == (value, HCResult.VALID)
+            assert hc.decode(code ^ 0b100) == (value, HCResult.CORRECTED)
+        assert hc.encode(64) is None
+        assert hc.decode(2048) == (None, HCResult.UNCORRECTABLE)
+
+    def test_generic_code(self):
+        """ A (15, 11) code is derived from its generator matrix and corrects single-bit errors """
+        columns = [0b0011, 0b0101, 0b0110, 0b0111, 0b1001, 0b1010, 0b1011, 0b1100, 0b1101, 0b1110, 0b1111]
+        gns = [[1 if i == j else 0 for j in range(11)] + list(unpack(col, 4)) for i, col in enumerate(columns)]
+        for i in range(1, 11):
+            gns[0] = [x ^ y for x, y in zip(gns[0], gns[i])]
+        hc = HammingCode(gns)
+        assert hc.total_bits == 15 and hc.data_bits == 11 and hc.parity_bits == 4
+        assert hc.g[0][:11] == [1] + [0] * 10
+        for value in (0, 1, 0b10110011101, 2047):
+            code = hc.encode(value)
+            assert hc.decode(code) == (value, HCResult.VALID)
+            assert hc.decode(code ^ (1 << 9)) == (value, HCResult.CORRECTED)
+            assert hc.decode(code ^ 0b11) == (None, HCResult.UNCORRECTABLE)
+        self.assertRaises(ValueError, HammingCode, [[1, 1, 0], [1, 1, 1]])
+
+    def test_cached_tables(self):
+        """ Decoders built from the same generator matrix share their tables """
+        assert HammingCode().syndrome_table is HammingCode().syndrome_table
+
+    def test_decode_soft(self):
+        """ Erased bits are filled in and, with confidences, the least confident bits are tried first """
+        hc = HammingCode()
+        code = (0, 1, 1, 1, 1, 1, 0, 0, 1, 1, 1)
+        data = hc.decode(code)[0]
+        assert hc.decode_soft(code) == (data, HCResult.VALID, ())
+        assert hc.decode_soft((0, None, 1, 1, None, 1, 0, 0, None, 1, 1)) == (data, HCResult.CORRECTED, (1, 4, 8))
+        assert hc.decode_soft((0, 1, 1, 1, None, 1, 1, 0, 1, 1, 1)) == (data, HCResult.CORRECTED, (4, 6))
+        assert hc.decode_soft((None, None, None, None, 1, 1, 0, 0, 1, 1, 1))[1] == HCResult.UNCORRECTABLE
+        double = (1, 1, 1, 1, 1, 1, 0, 0, 1, 0, 1)
+        assert hc.decode_soft(double)[1] == HCResult.UNCORRECTABLE
+        confidences = (0.6, 1, 1, 1, 1, 1, 1, 1, 1, 0.8, 1)
+        assert hc.decode_soft(double, confidences) == (data, HCResult.CORRECTED, (0, 9))
+        assert hc.decode_soft(double, (1,) * 11)[1] == HCResult.UNCORRECTABLE
+        # Two confident errors, a doubtful correct bit is no reason to correct a third bit
+        for doubtful in (1, 4, 10):
+            confidences = tuple(0.8 if i == doubtful else 1 for i in range(11))
+            assert hc.decode_soft(double, confidences) == (None, HCResult.UNCORRECTABLE, ())
+
+    def test_encode_batch(self):
+        """ Batch encoding gives the same codewords as encoding word by word """
+        hc = HammingCode()
+        program = [unpack(word, 6) for word in range(64)]
+        codes = hc.encode_batch(program)
+        assert [unpack(code, 11) for code in codes] == [hc.encode(word) for word in program]
+        assert list(hc.decode_batch(codes)[0]) == list(range(64))
+        self.assertRaises(ValueError, hc.encode_batch, [64])
+
+    def test_decode_batch(self):
+        """ Batch decoding gives the same results as decoding word by word """
+        hc = HammingCode()
+        codes = list(range(2048))
+        buffer = b"".join(code.to_bytes(2, "big") for code in codes)
+        expected_data = []
+        expected_codes = []
+        for code in codes:
+            data, result = hc.decode(code)
+            expected_data.append(-1 if data is None else data)
+            expected_codes.append(RESULT_CODES.index(result))
+        for words in (buffer, codes, [unpack(code, 11) for code in codes]):
+            data, results = hc.decode_batch(words)
+            assert list(data) == expected_data
+            assert list(results) == expected_codes
+
+
+class TestStackMachine(unittest.TestCase):
+    def test_dispatch(self):
+        """ Every codeword is dispatched with the name of its operation """
+        for instruction in Instruction:
+            sm = StackMachine()
+            sm.do(0b0011)
+            sm.do(0b0010)
+            sm.do(instruction.value)
+            assert sm.op == instruction.name
+        sm = StackMachine()
+        assert sm.do(0b0111) == SMState.RUNNING and sm.op is None
+        sm.do(Character.Q.value)
+        assert sm.op is None and sm.top() == "Q"
+        sm.do(Character.NOP.value)
+        assert sm.top() == "Q"
+
+    def test_stack(self):
+        """ The compact stack keeps numbers and characters and behaves like a list """
+        sm = StackMachine()
+        sm.do(0b0101)
+        sm.do(Character.SPACE.value)
+        sm.stack.append('s')
+        assert sm.stack == [5, "SPACE", "s"]
+        assert sm.top() == "s"
+        snapshot = sm.stack.copy()
+        assert sm.stack.pop() == "s"
+        assert sm.do(Instruction.ADD.value) == SMState.ERROR
+        sm.stack.pop()
+        assert sm.top() == tuple([0, 0, 0, 0, 0, 1, 0, 1])
+        assert len(snapshot) == 3 and snapshot[-1] == "s"
+
+    def test_alu_tables(self):
+        """ ALU instructions give 8-bit results and overflow flags from their tables """
+        cases = [
+            (Instruction.SUB, 7, 7, 0, False, SMState.RUNNING),
+            (Instruction.SUB, 3, 11, 248, True, SMState.RUNNING),
+            (Instruction.EXP, 255, 255, 255, True, SMState.RUNNING),
+            (Instruction.EXP, 0, 0, 1, False, SMState.RUNNING),
+            (Instruction.SHL, 1, 200, 0, True, SMState.RUNNING),
+            (Instruction.MOD, 9, 0, None, False, SMState.STOPPED),
+            (Instruction.XOR, 0b1100, 0b1010, 0b0110, False, SMState.RUNNING),
+        ]
+        for instruction, a, b, result, overflow, state in cases:
+            sm = StackMachine()
+            sm.stack.append(a)
+            sm.stack.append(b)
+            assert sm.do(instruction.value) == state
+            assert sm.overflow is overflow
+            assert (sm.stack[-1] if sm.stack else None) == result
+        sm = StackMachine()
+        sm.stack.append(255)
+        sm.do(Instruction.FAC.value)
+        assert sm.stack == [255] and sm.overflow is True
+        sm.do(Instruction.NOT.value)
+        assert sm.stack == [0]
+
 
 if __name__ == '__main__':
     unittest.main()
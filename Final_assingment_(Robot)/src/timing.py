@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Lightweight instrumentation of the card loop: named timing spans and counters,
+summarized per card and exported as a Chrome trace (open it in chrome://tracing
+or ui.perfetto.dev). Tracing is disabled by default, and a disabled span or
+counter costs a single attribute check.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from functools import wraps
+from time import perf_counter
+from typing import Callable
+
+
+class NullSpan:
+    """
+    Span returned while tracing is disabled, it does nothing
+    """
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    Measures the time spent inside a with block
+    """
+
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: dict = None) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.tracer.add(self.name, self.start, perf_counter(), self.args)
+        return False
+
+
+class Tracer:
+    """
+    Collects timing spans and counters from every thread
+    """
+
+    def __init__(self, enabled: bool = False, limit: int = 100000) -> None:
+        """
+        Args:
+            enabled: Whether spans and counters are recorded
+            limit: Trace events kept for the export, the oldest are dropped beyond it
+        """
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.origin = perf_counter()
+        # ("X", name, start, end, thread, args) spans and ("C", name, time, total, thread, None) counters
+        self.events = deque(maxlen=limit)
+        self.threads = {}
+        self.counters = OrderedDict()
+        self.card_spans = OrderedDict()
+        self.card_counters = OrderedDict()
+
+    def span(self, name: str, **args):
+        """
+        Returns a context manager timing its with block as a span
+
+        Args:
+            name: Name of the span
+            args: Values shown with the span in the trace
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args or None)
+
+    def timed(self, name: str) -> Callable:
+        """
+        Decorator timing every call of a function as a span. Whether tracing is enabled
+        is checked on every call, so functions can be decorated at import time.
+
+        Args:
+            name: Name of the span
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Increases a counter
+
+        Args:
+            name: Name of the counter
+            amount: Value added to the counter
+        """
+        if not self.enabled:
+            return
+        now = perf_counter()
+        with self.lock:
+            total = self.counters.get(name, 0) + amount
+            self.counters[name] = total
+            self.card_counters[name] = self.card_counters.get(name, 0) + amount
+            self.events.append(("C", name, now, total, self.__thread(), None))
+
+    def add(self, name: str, start: float, end: float, args: dict = None) -> None:
+        """
+        Records a span measured elsewhere
+
+        Args:
+            name: Name of the span
+            start: perf_counter() when the span started
+            end: perf_counter() when the span ended
+            args: Values shown with the span in the trace
+        """
+        with self.lock:
+            stats = self.card_spans.get(name)
+            if stats is None:
+                stats = self.card_spans[name] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += end - start
+            self.events.append(("X", name, start, end, self.__thread(), args))
+
+    def card_summary(self) -> dict:
+        """
+        Returns what has been recorded since the last summary and starts a new one
+
+        Returns:
+            dict: "spans" maps every span name to its (calls, total seconds), "counters" every counter to its increase
+        """
+        with self.lock:
+            summary = {
+                "spans": OrderedDict((name, tuple(stats)) for name, stats in self.card_spans.items()),
+                "counters": self.card_counters,
+            }
+            self.card_spans = OrderedDict()
+            self.card_counters = OrderedDict()
+        return summary
+
+    def export(self, path: str) -> None:
+        """
+        Writes the recorded events as a Chrome trace-event JSON file
+
+        Args:
+            path: File to write
+        """
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+        for kind, name, start, end, tid, args in events:
+            event = {"name": name, "ph": kind, "ts": (start - self.origin) * 1e6, "pid": pid, "tid": tid}
+            if kind == "X":
+                event["dur"] = (end - start) * 1e6
+                if args:
+                    event["args"] = args
+            else:
+                event["args"] = {name: end}
+            trace.append(event)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+
+    def __thread(self) -> int:
+        """
+        Returns the id of the current thread, remembering its name. Called with the lock held.
+        """
+        thread = threading.current_thread()
+        if thread.ident not in self.threads:
+            self.threads[thread.ident] = thread.name
+        return thread.ident
+
+
+def format_summary(summary: dict) -> str:
+    """
+    Formats a Tracer.card_summary() as a table, slowest spans first
+    """
+    lines = []
+    for name, (calls, seconds) in sorted(summary["spans"].items(), key=lambda item: -item[1][1]):
+        lines.append("{:<24}{:>6} calls{:>10.3f} s".format(name, calls, seconds))
+    for name, value in summary["counters"].items():
+        lines.append("{:<24}{:>6}".format(name, value))
+    return "\n".join(lines)
+
+
+# Tracer used by the robot code, enable it with tracer.enabled = True
+tracer = Tracer()